@@ -0,0 +1,74 @@
+"""
+Client throughput benchmarks against the in-process FakeMemdServer.
+
+    python benchmarks/bench_client.py --count 500 --workers 16 --latency 0.005
+
+Each scenario reports ops/sec and latency percentiles so regressions show up as numbers.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memd_api.bulk import BulkSummary, bounded_map, sync_roster  # noqa: E402
+from memd_api.client import Client  # noqa: E402
+from memd_api.fake_server import FakeMemdServer, make_member  # noqa: E402
+
+PLANCODE = "BENCH1"
+
+
+def run(name, func, items, workers):
+    summary = BulkSummary()
+    for item, _, exc, elapsed in bounded_map(func, items, workers=workers):
+        summary.record(None, elapsed, exc)
+    summary.finish()
+    return name, summary.as_dict()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=500, help="Operations per scenario")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random fake server latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 503 responses")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    results = []
+    with FakeMemdServer(latency=args.latency, latency_jitter=args.jitter, error_rate=args.error_rate,
+                        seed=1) as server:
+        client = Client(server.dict_config(pool_maxsize=args.workers, concurrency_max=max(64, args.workers)))
+        client.access_token
+        members = [make_member(i, plancode=PLANCODE) for i in range(args.count)]
+
+        results.append(run("get_or_create_primary_member", client.get_or_create_primary_member, members,
+                           args.workers))
+        external_ids = [m["externalID"] for m in members]
+        results.append(run("get_primary_member", client.get_primary_member, external_ids, args.workers))
+        # With --error-rate some creates fail, only members that exist go on to the update scenarios.
+        loaded = [client.get_primary_member(external_id) for external_id in external_ids
+                  if external_id in server.members]
+        results.append(run("update", lambda m: m.update(phone="480-555-0100"), loaded, args.workers))
+        results.append(run("create_policy", lambda m: m.create_policy("BENCH2"), loaded, args.workers))
+
+        roster = [make_member(args.count + i, plancode=PLANCODE) for i in range(args.count)]
+        summary = sync_roster(client, roster, workers=args.workers)
+        results.append(("bulk_sync", summary.as_dict()))
+
+    if args.json:
+        print(json.dumps(dict(results), indent=4))
+        return
+    print(f"{'scenario':<30} {'ops/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10} {'errors':>7}")
+    for name, result in results:
+        latency = result["latency_ms"]
+        print(f"{name:<30} {result['throughput_per_second']:>10} {latency['p50']:>10} {latency['p95']:>10} "
+              f"{latency['p99']:>10} {latency['max']:>10} {result['failed']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+CLI startup time benchmark.
+
+    python benchmarks/bench_startup.py --runs 20
+
+Runs each scenario in a fresh interpreter with HOME pointed at an empty temporary directory, and reports
+wall time percentiles, which heavy modules (requests, jsonschema, names) ended up imported and what was
+created under HOME.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("requests", "jsonschema", "names")
+
+# Each scenario runs the cli with these arguments, then reports the heavy modules that got imported.
+SCENARIO_TEMPLATE = """
+import sys
+from memd_api.command_line import cli
+try:
+    cli({args!r}, standalone_mode=False)
+except SystemExit:
+    pass
+sys.stderr.write(repr([m for m in {heavy!r} if m in sys.modules]))
+"""
+
+SCENARIOS = (
+    ("python -c pass", None),
+    ("import command_line", "import memd_api.command_line"),
+    ("--help", ["--help"]),
+    ("member --help", ["member", "--help"]),
+    ("member create --help", ["member", "create", "--help"]),
+    ("member ls --count", ["--no-token-cache", "member", "ls", "--count"]),
+)
+
+
+def time_scenario(code, runs):
+    timings = []
+    modules = None
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+        for _ in range(runs):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-c", code], env=env, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.PIPE, universal_newlines=True)
+            timings.append(time.perf_counter() - start)
+            modules = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "[]"
+        created = sorted(os.path.relpath(os.path.join(d, f), home) for d, _, files in os.walk(home) for f in files)
+    timings.sort()
+    return {
+        "runs": runs,
+        "mean_ms": round(statistics.mean(timings) * 1000, 2),
+        "p50_ms": round(statistics.median(timings) * 1000, 2),
+        "min_ms": round(timings[0] * 1000, 2),
+        "heavy_modules": modules,
+        "created": created
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Interpreter launches per scenario")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, scenario in SCENARIOS:
+        if scenario is None:
+            code = "pass"
+        elif isinstance(scenario, str):
+            code = scenario + "\nimport sys\nsys.stderr.write(repr([m for m in %r if m in sys.modules]))" % (
+                HEAVY_MODULES,)
+        else:
+            code = SCENARIO_TEMPLATE.format(args=scenario, heavy=HEAVY_MODULES)
+        results.append((name, time_scenario(code, args.runs)))
+
+    if args.json:
+        print(json.dumps(dict(results), indent=4))
+        return
+    print(f"{'scenario':<25} {'mean ms':>10} {'p50 ms':>10} {'min ms':>10}  heavy modules / created in HOME")
+    for name, result in results:
+        print(f"{name:<25} {result['mean_ms']:>10} {result['p50_ms']:>10} {result['min_ms']:>10}  "
+              f"{result['heavy_modules']} {result['created']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+
+from .client import Client
+
+
+class AsyncClient:
+    """
+    asyncio counterpart to Client.
+
+    Every blocking call made by Client and PrimaryMember is dispatched to a thread pool sized to
+    max_concurrency, and a semaphore bounds how many of them are in flight at once, so a slow MEMD
+    response only holds up its own coroutine. The bearer token is acquired once under an asyncio.Lock
+    and shared by every coroutine running on the loop.
+    """
+
+    def __init__(self, dict_config=None, max_concurrency=32, client=None):
+        """
+        :param dict_config: (dict) Same as Client, ignored if client is set. Its adaptive limiter starts at
+            max_concurrency unless concurrency_initial and concurrency_max are set.
+        :param max_concurrency: (int) Maximum number of MEMD requests in flight. The Client's adaptive
+            limiter also bounds them, so with an existing client or a config from the environment no more than
+            that client's concurrency limit (concurrency_initial to begin with) are actually sent at once.
+        :param client: (Client) Optional existing client to wrap
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1, got %s" % max_concurrency)
+        self.logger = logging.getLogger(__name__)
+        if client is None:
+            if dict_config is not None:
+                dict_config = dict(dict_config)
+                if dict_config.get("concurrency_max") in (None, ""):
+                    dict_config["concurrency_max"] = max(max_concurrency, Client.SETTINGS["concurrency_max"][0])
+                if dict_config.get("concurrency_initial") in (None, ""):
+                    dict_config["concurrency_initial"] = min(max_concurrency, int(dict_config["concurrency_max"]))
+            client = Client(dict_config)
+        self._client = client
+        self.max_concurrency = max_concurrency
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency,
+                                                               thread_name_prefix="memd-api")
+        self._semaphore = None
+        self._token_lock = None
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def base_url(self):
+        return self._client.base_url
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """ Waits for calls in flight on a helper thread, so the event loop keeps running meanwhile. """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self._executor.shutdown, wait=True))
+
+    # Kept for callers written against the first version of this class.
+    close = aclose
+
+    def _primitives(self):
+        # Created lazily so they bind to the loop that is actually running the coroutines.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._token_lock = asyncio.Lock()
+        return self._semaphore, self._token_lock
+
+    async def _run(self, func, *args, **kwargs):
+        semaphore, _ = self._primitives()
+        await self._ensure_token()
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _ensure_token(self):
+        if not self._client._token_needs_refresh():
+            return
+        _, token_lock = self._primitives()
+        async with token_lock:
+            # Coroutines queued behind the refresh find a fresh token and return without fetching.
+            if self._client._token_needs_refresh():
+                await self._set_token()
+
+    async def _set_token(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._client._set_token)
+
+    async def get_access_token(self):
+        await self._ensure_token()
+        return self._client.access_token
+
+    async def _get_json(self, url, raise_for_status=True):
+        return await self._run(self._client._get_json, url, raise_for_status=raise_for_status)
+
+    async def _post_json(self, url, payload, raise_for_status=True):
+        return await self._run(self._client._post_json, url, payload, raise_for_status=raise_for_status)
+
+    async def _put_json(self, url, payload, raise_for_status=True):
+        return await self._run(self._client._put_json, url, payload, raise_for_status=raise_for_status)
+
+    def validate_member(self, member_dict):
+        self._client.validate_member(member_dict)
+
+    async def get_primary_member(self, external_id):
+        member = await self._run(self._client.get_primary_member, external_id)
+        return AsyncPrimaryMember(self, member)
+
+    async def create_primary_member(self, member_dict):
+        """
+        Creates a new primary member
+        :param member_dict: (dict) Member Configuration based on PRIMARY_MEMBER_SCHEMA
+        :return: AsyncPrimaryMember
+        """
+        member = await self._run(self._client.create_primary_member, member_dict)
+        return AsyncPrimaryMember(self, member)
+
+    async def get_or_create_primary_member(self, member_dict, ensure_plancode=True, dry_run=False):
+        """
+        Either creates a new primary member or retrieves an existing one
+        :param member_dict: (dict) Member Configuration based on PRIMARY_MEMBER_SCHEMA
+        :return: AsyncPrimaryMember
+        """
+        member = await self._run(self._client.get_or_create_primary_member, member_dict,
+                                 ensure_plancode=ensure_plancode, dry_run=dry_run)
+        return AsyncPrimaryMember(self, member)
+
+
+class AsyncPrimaryMember:
+    """
+    Wraps a PrimaryMember so its network operations can be awaited.
+
+    Each operation runs as a single unit in the client's thread pool, so multi-request flows such as
+    create_policy keep the exact sequencing (and revert-on-failure behaviour) of PrimaryMember.
+    Attribute reads are passed through to the wrapped member.
+    """
+
+    def __init__(self, client, member):
+        self._async_client = client
+        self._member = member
+
+    def __getattr__(self, item):
+        return getattr(self._member, item)
+
+    def __repr__(self):
+        return f"<AsyncPrimaryMember {self._member._id}>"
+
+    @property
+    def member(self):
+        return self._member
+
+    def as_dict(self):
+        return self._member.as_dict()
+
+    def active_policies(self):
+        return self._member.active_policies()
+
+    async def reload(self):
+        return await self._async_client._run(self._member.reload)
+
+    async def update(self, dry_run=False, **kwargs):
+        return await self._async_client._run(self._member.update, dry_run=dry_run, **kwargs)
+
+    async def save(self, dry_run=False):
+        return await self._async_client._run(self._member.save, dry_run=dry_run)
+
+    async def create_policy(self, plancode, benefitstart=None, dry_run=False):
+        return await self._async_client._run(self._member.create_policy, plancode,
+                                             benefitstart=benefitstart, dry_run=dry_run)
+
+    async def ensure_plancode(self, plancode, benefitstart=None, dry_run=False):
+        return await self._async_client._run(self._member.ensure_plancode, plancode,
+                                             benefitstart=benefitstart, dry_run=dry_run)
+
+    async def terminate_policy(self, plancode, benefitend=None, dry_run=False):
+        return await self._async_client._run(self._member.terminate_policy, plancode,
+                                             benefitend=benefitend, dry_run=dry_run)
+
+    async def deactivate_policies(self, dry_run=False):
+        return await self._async_client._run(self._member.deactivate_policies, dry_run=dry_run)
@@ -0,0 +1,305 @@
+import collections
+import concurrent.futures
+import json
+import logging
+import time
+
+from . import operations
+from .journal import DONE, FAILED, STARTED
+
+logger = logging.getLogger(__name__)
+
+
+def iter_roster(path):
+    """
+    Yields member dicts from a roster file.
+    A .json file must hold a list of members (or a single member), anything else is read as NDJSON.
+    """
+    if path.endswith(".json"):
+        with open(path, "r") as fp:
+            data = json.load(fp)
+        if isinstance(data, dict):
+            data = [data]
+        for row in data:
+            yield row
+    else:
+        with open(path, "r") as fp:
+            for line in fp:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def iter_ids(path):
+    """ Yields externalIDs from a file with one per line, blank lines and # comments are skipped. """
+    with open(path, "r") as fp:
+        for line in fp:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def bounded_map(func, items, workers=8, ordered=False):
+    """
+    Runs func over items on a thread pool, yielding (item, result, exc, elapsed) as calls finish.
+    At most 2 * workers calls are queued at a time, so items can be a lazy iterator of any length.
+    :param ordered: (bool) Yield in input order instead. A slow call holds back later results, but
+        never more than 2 * workers of them.
+    """
+    max_pending = workers * 2
+
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            return func(item), None, time.perf_counter() - start
+        except Exception as exc:
+            return None, exc, time.perf_counter() - start
+
+    if ordered:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            window = collections.deque()
+            for item in items:
+                window.append((item, executor.submit(timed, item)))
+                if len(window) >= max_pending:
+                    item, future = window.popleft()
+                    yield (item,) + future.result()
+            while window:
+                item, future = window.popleft()
+                yield (item,) + future.result()
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        items = iter(items)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                else:
+                    pending[executor.submit(timed, item)] = item
+            if not pending:
+                break
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                result, exc, elapsed = future.result()
+                yield item, result, exc, elapsed
+
+
+def export_members(client, external_ids, fp, workers=8, ordered=False, policies=False):
+    """
+    Fetches members concurrently and writes them to fp as compact NDJSON as they arrive.
+    Only the in-flight window is held in memory, whatever the number of members.
+    :param policies: (bool) Write each policy as its own {"record": "policy", "externalID": ...} line after
+        its {"record": "member", ...} line, instead of nesting them in the member
+    :return: (exported, failed) counts
+    """
+    exported = failed = 0
+    client.access_token
+    for external_id, member_data, exc, _ in bounded_map(client._get_member_json, external_ids, workers=workers,
+                                                        ordered=ordered):
+        if exc is not None:
+            failed += 1
+            logger.error("Export failed for %s: %s", external_id, exc)
+            continue
+        if policies:
+            member_policies = member_data.get("policies") or []
+            member_data = {k: v for k, v in member_data.items() if k != "policies"}
+            member_data = dict({"record": "member"}, **member_data)
+            lines = [member_data] + [dict({"record": "policy", "externalID": external_id}, **p)
+                                     for p in member_policies]
+        else:
+            lines = [member_data]
+        fp.write("".join(json.dumps(line, separators=(",", ":"), default=str) + "\n" for line in lines))
+        exported += 1
+    return exported, failed
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class BulkSummary(object):
+    MAX_ERRORS_KEPT = 50
+
+    def __init__(self, key_name="externalID"):
+        self.key_name = key_name
+        self.succeeded = 0
+        self.failed = 0
+        self.latencies = []
+        self.errors = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, key, elapsed, exc=None):
+        self.latencies.append(elapsed)
+        if exc is None:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+            if len(self.errors) < self.MAX_ERRORS_KEPT:
+                self.errors.append({self.key_name: key, "error": str(exc)})
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def merge(self, other):
+        """ Adds another summary's counts, latencies and errors, e.g. from a worker process. """
+        self.succeeded += other.succeeded
+        self.failed += other.failed
+        self.latencies.extend(other.latencies)
+        self.errors.extend(other.errors[:self.MAX_ERRORS_KEPT - len(self.errors)])
+
+    def as_dict(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        total = self.succeeded + self.failed
+        latencies = sorted(self.latencies)
+        return {
+            "processed": total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_per_second": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                "p50": round(percentile(latencies, 50) * 1000, 2),
+                "p95": round(percentile(latencies, 95) * 1000, 2),
+                "p99": round(percentile(latencies, 99) * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0
+            },
+            "errors": self.errors
+        }
+
+
+def sync_roster(client, rows, workers=8, dry_run=False):
+    """
+    Runs get_or_create_primary_member (with ensure_plancode) for every row, sharing one client.
+    :param client: (Client) Authenticated client shared by all workers
+    :param rows: Iterable of member dicts based on PRIMARY_MEMBER_SCHEMA
+    :param workers: (int) Number of worker threads
+    :param dry_run: (bool) Passed through to get_or_create_primary_member
+    :return: BulkSummary
+    """
+    summary = BulkSummary()
+    # Fetch the token up front so the workers don't all race to authenticate.
+    client.access_token
+
+    def sync_one(row):
+        return client.get_or_create_primary_member(row, ensure_plancode=True, dry_run=dry_run)
+
+    for row, _, exc, elapsed in bounded_map(sync_one, rows, workers=workers):
+        external_id = row.get("externalID") if isinstance(row, dict) else None
+        if exc is not None:
+            logger.error("Sync failed for %s: %s", external_id, exc)
+        summary.record(external_id, elapsed, exc)
+    summary.finish()
+    return summary
+
+
+def iter_batch_lines(path, states=None):
+    """ Yields (index, line) for the non-blank lines of an operations file, skipping those DONE in states. """
+    with open(path, "r") as fp:
+        for index, line in enumerate(fp):
+            if states is not None and index < len(states) and states[index] == DONE:
+                continue
+            line = line.strip()
+            if line:
+                yield index, line
+
+
+def run_batch(client, ops_path, journal, workers=8, resume=False, prepare=None, coalesce=False):
+    """
+    Runs an NDJSON file of operations, {"op": name, **params} with names from operations.OPERATIONS,
+    recording each start, completion and failure in journal.
+    :param journal: (Journal) Indexed by the operation's line in ops_path
+    :param resume: (bool) Skip operations the journal has as done, without parsing them, and run the ones
+        that were in flight or failed with the retry-safe variant of their operation
+    :param prepare: Optional callable(op, params) returning the params to run with
+    :param coalesce: (bool) Read the whole file and run one merged MemberPlan per externalID instead
+    :return: (BulkSummary, stats) stats counts skipped operations, operations run and members touched
+    """
+    states = journal.states() if resume else bytearray()
+    stats = {"skipped": states.count(DONE), "operations": 0, "members": 0}
+    summary = BulkSummary(key_name="line")
+    client.access_token
+
+    def parse(line):
+        params = json.loads(line)
+        op = params.pop("op").replace("-", "_")
+        if prepare is not None:
+            params = prepare(op, params)
+        return op, params
+
+    def run_one(entry):
+        index, line = entry
+        try:
+            op, params = parse(line)
+        except Exception:
+            journal.failed(index)
+            raise
+        return run_parsed((index, op, params))
+
+    def run_parsed(entry):
+        index, op, params = entry
+        retry = index < len(states) and states[index] in (STARTED, FAILED)
+        journal.start(index)
+        try:
+            result = operations.run(client, op, params, retry=retry)
+        except Exception:
+            journal.failed(index)
+            raise
+        journal.done(index)
+        return result
+
+    def run_plan(plan):
+        for index in plan.indices:
+            journal.start(index)
+        try:
+            result = plan.run(client)
+        except Exception:
+            for index in plan.indices:
+                journal.failed(index)
+            raise
+        for index in plan.indices:
+            journal.done(index)
+        return result
+
+    with journal:
+        if not coalesce:
+            for (index, _), _, exc, elapsed in bounded_map(run_one, iter_batch_lines(ops_path, states),
+                                                           workers=workers):
+                stats["operations"] += 1
+                if exc is not None:
+                    logger.error("Operation on line %s failed: %s", index + 1, exc)
+                summary.record(index + 1, elapsed, exc)
+        else:
+            from .coalesce import coalesce as coalesce_entries
+            entries = []
+            for index, line in iter_batch_lines(ops_path, states):
+                try:
+                    entries.append((index,) + parse(line))
+                except Exception as exc:
+                    journal.failed(index)
+                    summary.record(index + 1, 0.0, exc)
+            plans, rejected, separate = coalesce_entries(entries)
+            stats["operations"] = len(entries) + summary.failed
+            stats["members"] = len(plans)
+            for index, exc in rejected:
+                journal.failed(index)
+                summary.record(index + 1, 0.0, exc)
+            for (index, _, _), _, exc, elapsed in bounded_map(run_parsed, separate, workers=workers):
+                if exc is not None:
+                    logger.error("Operation on line %s failed: %s", index + 1, exc)
+                summary.record(index + 1, elapsed, exc)
+            for plan, _, exc, elapsed in bounded_map(run_plan, plans, workers=workers):
+                if exc is not None:
+                    logger.error("Operations for %s failed: %s", plan.external_id, exc)
+                summary.record(plan.indices[0] + 1, elapsed, exc)
+    summary.finish()
+    return summary, stats
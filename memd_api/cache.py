@@ -0,0 +1,96 @@
+import collections
+import copy
+import threading
+import time
+
+
+class MemberCache(object):
+    """
+    Thread-safe read-through cache of /v1/partnermember responses keyed by externalID.
+
+    Entries are fresh for ttl seconds, after which they are only used to revalidate with the ETag the
+    server sent (If-None-Match). At most max_entries members are kept, the least recently used is evicted.
+    Callers get deep copies so cached documents can't be changed behind the cache's back.
+    """
+
+    def __init__(self, ttl=60.0, max_entries=10000):
+        if ttl <= 0:
+            raise ValueError(f"ttl must be positive, got {ttl}")
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1, got {max_entries}")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key):
+        """
+        :return: (data, etag) for a fresh entry, (None, etag) for a stale one that can be revalidated,
+            or (None, None) if the member isn't cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            data, etag, stored_at = entry
+            self._entries.move_to_end(key)
+            if time.monotonic() - stored_at < self.ttl:
+                self.hits += 1
+                return copy.deepcopy(data), etag
+            self.misses += 1
+            if etag is None:
+                del self._entries[key]
+            return None, etag
+
+    def revalidate(self, key):
+        """ Marks a stale entry fresh again after a 304, returns its data or None if it was dropped meanwhile. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            data, etag, _ = entry
+            self._entries[key] = (data, etag, time.monotonic())
+            self._entries.move_to_end(key)
+            self.revalidated += 1
+            return copy.deepcopy(data)
+
+    def put(self, key, data, etag=None):
+        data = copy.deepcopy(data)
+        with self._lock:
+            self._entries[key] = (data, etag, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -1,11 +1,28 @@
-from .utils import load_env
+from .utils import load_env, to_bool, to_int_tuple, to_optional_float
+from .cache import MemberCache
 from .members import PrimaryMember
+from .metrics import MetricsRegistry
+from .singleflight import SingleFlight
+from .throttle import AdaptiveLimiter, CircuitBreaker, RateLimiter
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 import datetime
-from jsonschema import validate
+import collections
+import concurrent.futures
+import email.utils
+import json
+import os
+import random
+import threading
+import time
 import logging
 
 
+# obtained_at is a naive UTC datetime. Tokens are replaced whole, so readers never see a half-updated one.
+BearerToken = collections.namedtuple("BearerToken", ("access_token", "token_type", "expires_in", "obtained_at"))
+
+
 class Client:
     PRIMARY_MEMBER_SCHEMA = {
         "type": "object",
@@ -89,9 +106,35 @@ class Client:
         "required": ["externalID", "name", "email", "phone", "dob", "gender", "address", "rxDiscounts",
                      "termsAgreed", "preferredLanguage", "plancode", "relationship", "benefitstart", "benefitend"]
     }
-    _session = None
+    # Optional settings read from dict_config (or MEMD_API_<NAME> environment variables): name -> (default, converter)
+    SETTINGS = {
+        "token_refresh_margin": (60.0, float),
+        "timeout": (None, to_optional_float),
+        "pool_connections": (10, int),
+        "pool_maxsize": (10, int),
+        "keep_alive": (True, to_bool),
+        "max_retries": (3, int),
+        "backoff_factor": (0.5, float),
+        "backoff_max": (30.0, float),
+        "retry_statuses": ((429, 500, 502, 503, 504), to_int_tuple),
+        "post_retry_policy": ("never", str),
+        "concurrency_initial": (10, int),
+        "concurrency_min": (1, int),
+        "concurrency_max": (64, int),
+        "latency_tolerance": (2.0, float),
+        "breaker_failure_threshold": (5, int),
+        "breaker_reset_timeout": (30.0, float),
+        "cache_ttl": (0.0, float),
+        "cache_max_entries": (10000, int),
+        "single_flight": (True, to_bool),
+        "rate_limit": (0.0, float)
+    }
+    ENDPOINTS = ("token", "partnermember", "policy")
+    POST_RETRY_POLICIES = ("never", "safe")
+    IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+    _validator = None
 
-    def __init__(self, dict_config=None):
+    def __init__(self, dict_config=None, token_store=None, mirror=None, metrics=None, rate_limiter=None):
         """
         Client Configuration:
         Can be set by passing dict_config
@@ -103,13 +146,38 @@ class Client:
         MEMD_API_CLIENT_ID
         MEMD_API_CLIENT_SECRET
         :param dict_config (dict) If set, must contain keys for base_url, username, password, client_id, client_secret
+            It may also set any of the optional SETTINGS:
+            token_refresh_margin: Seconds before expiry at which the token is refreshed
+            timeout: Seconds to wait for MEMD to respond, unset waits forever
+            pool_connections, pool_maxsize: Connection pool sizes of the underlying session
+            keep_alive: Reuse connections between requests
+            max_retries, backoff_factor, backoff_max: Retries with jittered exponential backoff, Retry-After wins.
+                A Retry-After longer than backoff_max ends the retries instead of being shortened
+            retry_statuses: Comma separated status codes that are retried
+            post_retry_policy: "never" retries no POST, "safe" retries POSTs MEMD provably did not process
+            concurrency_initial, concurrency_min, concurrency_max: Bounds of the adaptive in-flight request limit
+            latency_tolerance: Latency, as a multiple of the healthy baseline, treated as MEMD being overloaded
+            breaker_failure_threshold, breaker_reset_timeout: Consecutive failures that open an endpoint's
+                circuit breaker and the seconds it stays open
+            cache_ttl, cache_max_entries: Enable the member cache with entries fresh for cache_ttl seconds
+            single_flight: Concurrent GETs of the same member and token refreshes share one request
+            rate_limit: Requests per second this client may send, 0 is unlimited
+        :param token_store (FileTokenStore) If set, bearer tokens are shared through it across clients and processes
+        :param mirror (MemberMirror) If set, every member document received from MEMD is recorded in it
+        :param metrics (MetricsRegistry) Registry to record request metrics in, a new one is created if not set
+        :param rate_limiter (RateLimiter) Request budget to draw from, e.g. one shared by several processes.
+            Defaults to a limiter for the rate_limit setting
         """
         self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG)
-        self._access_token = None
-        self._access_token_type = 'bearer'
-        self._access_token_expires_in = 0
-        self._access_token_last_refreshed = None
+        self._token = None
+        self._token_lock = threading.Lock()
+        self._token_session = None
+        self._adapter = None
+        self._adapter_lock = threading.Lock()
+        self._local = threading.local()
+        self.token_store = token_store
+        self.mirror = mirror
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
         if dict_config is not None:
             if not isinstance(dict_config, dict):
                 raise ValueError("dict_config must be of type dict, got %s" % type(dict_config))
@@ -127,38 +195,154 @@ class Client:
             self.password = load_env("MEMD_API_PASSWORD")
             self.client_id = load_env("MEMD_API_CLIENT_ID")
             self.client_secret = load_env("MEMD_API_CLIENT_SECRET")
+        self._load_settings(dict_config)
         if self.base_url.endswith("/"):
             self.base_url = self.base_url[:-1]
+        self.limiter = AdaptiveLimiter(initial=self.concurrency_initial, minimum=self.concurrency_min,
+                                       maximum=self.concurrency_max, latency_tolerance=self.latency_tolerance)
+        self.breakers = {name: CircuitBreaker(name, failure_threshold=self.breaker_failure_threshold,
+                                              reset_timeout=self.breaker_reset_timeout)
+                         for name in self.ENDPOINTS}
+        self.rate_limiter = rate_limiter
+        if self.rate_limiter is None and self.rate_limit > 0:
+            self.rate_limiter = RateLimiter(self.rate_limit)
+        self.flights = SingleFlight()
+        self.member_cache = None
+        if self.cache_ttl > 0:
+            self.member_cache = MemberCache(ttl=self.cache_ttl, max_entries=self.cache_max_entries)
+
+    def _load_settings(self, dict_config):
+        for name, (default, converter) in self.SETTINGS.items():
+            if dict_config is not None:
+                value = dict_config.get(name)
+            else:
+                value = load_env(f"MEMD_API_{name.upper()}", "")
+            if value is None or value == "":
+                value = default
+            else:
+                try:
+                    value = converter(value)
+                except ValueError as exc:
+                    raise ValueError(f"Invalid value for {name}: {exc}")
+            setattr(self, name, value)
+        if self.post_retry_policy not in self.POST_RETRY_POLICIES:
+            raise ValueError(f"post_retry_policy must be one of {self.POST_RETRY_POLICIES}, got {self.post_retry_policy}")
 
     @property
     def access_token(self):
-        if self._access_token is None:
+        """ A current bearer token, refreshed first if it is missing or about to expire. """
+        token = self._token
+        if token is None or self._token_needs_refresh(token):
             self._set_token()
-        return self._access_token
+            token = self._token
+        return token.access_token
+
+    def _get_adapter(self):
+        """ One connection pool per client, shared by the sessions of all its threads. """
+        if self._adapter is None:
+            with self._adapter_lock:
+                if self._adapter is None:
+                    # Retries are handled by _request so they can honor Retry-After and the POST retry policy.
+                    self._adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                                                pool_maxsize=self.pool_maxsize, max_retries=0)
+        return self._adapter
+
+    def _build_session(self):
+        s = requests.Session()
+        adapter = self._get_adapter()
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        if not self.keep_alive:
+            s.headers.update({"Connection": "close"})
+        return s
 
     @property
     def session(self):
-        if self._session is None:
-            s = requests.Session()
-            s.headers.update({
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.access_token}"
-            })
-            self._session = s
-        if self._token_needs_refresh():
-            self._set_token()
-            self._session.headers.update({
-                "Authorization": f"Bearer {self.access_token}"
-            })
-        return self._session
+        """
+        This thread's session. Sessions hold cookies and default headers, which aren't safe to share
+        between threads, while the connection pool underneath is shared. Authorization is added per request.
+        """
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._build_session()
+            s.headers.update({"Content-Type": "application/json"})
+            self._local.session = s
+        return s
 
-    def _token_needs_refresh(self):
-        if self._access_token_last_refreshed is None:
+    def _token_needs_refresh(self, token=None):
+        if token is None:
+            token = self._token
+        if token is None:
             return True
-        expires_at = self._access_token_last_refreshed + datetime.timedelta(seconds=self._access_token_expires_in)
+        # Refresh a little early so requests in flight never carry a token that expires mid-call.
+        margin = min(self.token_refresh_margin, token.expires_in / 2.0)
+        expires_at = token.obtained_at + datetime.timedelta(seconds=token.expires_in - margin)
         return expires_at <= datetime.datetime.utcnow()
 
+    def _token_store_key(self):
+        return self.token_store.key_for(self.base_url, self.username, self.client_id)
+
+    def _load_stored_token(self):
+        """ Adopts the token from token_store if it is still fresh, returns True if it was. """
+        stored = self.token_store.load(self._token_store_key())
+        if stored is None:
+            return False
+        token = BearerToken(stored["access_token"], stored["token_type"], stored["expires_in"],
+                            datetime.datetime.utcfromtimestamp(stored["obtained_at"]))
+        if self._token_needs_refresh(token):
+            return False
+        self._token = token
+        self.logger.debug("Using stored token")
+        return True
+
     def _set_token(self):
+        if not self.single_flight:
+            return self._refresh_token()
+        _, shared = self.flights.do(("token",), self._refresh_token)
+        if shared:
+            self.metrics.record_collapsed("token")
+
+    def _refresh_token(self):
+        with self._token_lock:
+            # Another thread may have refreshed the token while this one waited for the lock.
+            if not self._token_needs_refresh():
+                return
+            if self.token_store is None:
+                self._fetch_token()
+                return
+            if self._load_stored_token():
+                return
+            key = self._token_store_key()
+            with self.token_store.lock(key):
+                # Only the first process through the lock fetches, the rest pick up what it stored.
+                if self._load_stored_token():
+                    return
+                self._fetch_token()
+                token = self._token
+                self.token_store.save(key, {
+                    "access_token": token.access_token,
+                    "token_type": token.token_type,
+                    "expires_in": token.expires_in,
+                    "obtained_at": (token.obtained_at - datetime.datetime(1970, 1, 1)).total_seconds()
+                })
+
+    def _invalidate_token(self, access_token):
+        """
+        Forgets access_token after MEMD rejected it, here and in token_store, so the next call fetches a new
+        one. Does nothing if another thread or process already replaced it.
+        """
+        with self._token_lock:
+            if self._token is not None and self._token.access_token == access_token:
+                self._token = None
+            if self.token_store is None:
+                return
+            key = self._token_store_key()
+            with self.token_store.lock(key):
+                stored = self.token_store.load(key)
+                if stored is not None and stored["access_token"] == access_token:
+                    self.token_store.clear(key)
+
+    def _fetch_token(self):
         headers = {
             "Accept": "application/json",
             "Content-Type": "application/x-www-form-urlencoded"
@@ -166,103 +350,421 @@ class Client:
         payload = f"grant_type=password&username={self.username}&password={self.password}&client_id={self.client_id}&client_secret={self.client_secret}"
         url = f"{self.base_url}/v2/token"
         self.logger.debug("Retrieving Bearer Token")
-        response = requests.request("POST", url, headers=headers, data=payload)
-        self.logger.debug(f"{response.request.url} {response.status_code} {response.reason}")
-        response.raise_for_status()
+        if self._token_session is None:
+            self._token_session = self._build_session()
+        # Fetching a token has no side effects, so it is retried like an idempotent call.
+        response = self._request("POST", url, idempotent=True, session=self._token_session, headers=headers,
+                                 data=payload, log_body=False)
         data = response.json()
-        self._access_token = data["access_token"]
-        self._access_token_type = data["token_type"]
-        self._access_token_expires_in = data["expires_in"]
-        self._access_token_last_refreshed = datetime.datetime.utcnow()
-        self.logger.debug(f"Refreshed token, expires in {self._access_token_expires_in}")
+        self._token = BearerToken(data["access_token"], data["token_type"], data["expires_in"],
+                                  datetime.datetime.utcnow())
+        self.logger.debug("Refreshed token, expires in %s", data["expires_in"])
 
-    def _post_json(self, url, payload, raise_for_status=True):
-        r = self.session.post(url, json=payload)
-        if raise_for_status:
+    def _retry_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    delay = float(retry_after)
+                except ValueError:
+                    try:
+                        retry_at = email.utils.parsedate_to_datetime(retry_after)
+                    except (TypeError, ValueError):
+                        retry_at = None
+                    delay = None if retry_at is None else (
+                        retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds()
+                if delay is not None:
+                    return max(delay, 0.0)
+        # Full jitter spreads retries from many workers instead of having them return in lockstep.
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    @staticmethod
+    def _request_not_sent(exc):
+        """ True if the connection failed before the request could reach MEMD. """
+        if isinstance(exc, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(exc, requests.exceptions.ConnectionError) and exc.args:
+            reason = getattr(exc.args[0], "reason", None)
+            return isinstance(reason, NewConnectionError)
+        return False
+
+    def _can_retry(self, attempt, idempotent, exc=None, response=None):
+        if attempt >= self.max_retries:
+            return False
+        if idempotent:
+            return True
+        if self.post_retry_policy == "safe":
+            # 429 and 503 mean MEMD refused the request without processing it.
+            if exc is not None:
+                return self._request_not_sent(exc)
+            return response.status_code in (429, 503)
+        return False
+
+    def _endpoint_for(self, url):
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else url
+        if path.startswith("/v2/token"):
+            return "token"
+        if "/policy" in path:
+            return "policy"
+        return "partnermember"
+
+    def _metric_name(self, method, url):
+        """ The logical endpoint a request is recorded under in metrics. """
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else url
+        path = path.split("?", 1)[0].rstrip("/")
+        parts = path.split("/")
+        method = method.upper()
+        if path == "/v2/token":
+            return "token"
+        if parts[1:3] == ["v1", "partnermember"]:
+            if len(parts) == 3 and method == "POST":
+                return "create_member"
+            if len(parts) == 4:
+                return {"GET": "get_member", "PUT": "update_member"}.get(method, "other")
+            if len(parts) == 5 and parts[4] == "policy" and method == "POST":
+                return "create_policy"
+        if parts[1:3] == ["v1", "member"] and len(parts) == 6 and parts[4] == "policy" and method == "POST":
+            return "terminate_policy"
+        return "other"
+
+    def limits(self):
+        """ Current adaptive concurrency limit and circuit breaker states, for monitoring. """
+        return {
+            "concurrency": self.limiter.snapshot(),
+            "breakers": {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+        }
+
+    def _send(self, session, method, url, **kwargs):
+        """ Sends one attempt, feeding its outcome to the endpoint's circuit breaker and the concurrency limiter. """
+        endpoint = self._endpoint_for(url)
+        breaker = self.breakers[endpoint]
+        breaker.before_call()
+        # Token requests skip the limiters, they are rare and every other request waits on them.
+        if self.rate_limiter is not None and endpoint != "token":
+            self.rate_limiter.acquire()
+        started = None if endpoint == "token" else self.limiter.acquire()
+        status = None
+        r = None
+        request_started = time.perf_counter()
+        try:
+            r = session.request(method, url, **kwargs)
+            status = r.status_code
+            return r
+        finally:
+            latency = time.perf_counter() - request_started
+            failed = status is None or status >= 500
+            if started is not None:
+                self.limiter.release(started, overloaded=failed or status == 429, endpoint=endpoint)
+            breaker.record(failed)
+            request_bytes = response_bytes = 0
+            if r is not None:
+                body = r.request.body
+                request_bytes = len(body) if body else 0
+                response_bytes = len(r.content or b"")
+            self.metrics.observe(self._metric_name(method, url), latency, status if status is not None else "error",
+                                 request_bytes=request_bytes, response_bytes=response_bytes)
+
+    def _request(self, method, url, idempotent=None, raise_for_status=True, session=None, log_body=True, **kwargs):
+        """
+        Sends a request through this thread's session, retrying transient failures.
+        Unless session is given, the bearer token is added to the headers of each attempt.
+        Raises CircuitOpenError without sending anything while the endpoint's circuit breaker is open.
+        :param idempotent: (bool) Retry on any transient failure, defaults to True for GET/PUT/DELETE.
+            Other requests are only retried as allowed by post_retry_policy.
+        :return: requests.Response
+        """
+        if idempotent is None:
+            idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        reauthenticated = False
+        while True:
+            if session is None:
+                s = self.session
+                # The token is read per attempt, so a retry after a refresh carries the new one.
+                access_token = self.access_token
+                kwargs["headers"] = dict(kwargs.get("headers") or {}, Authorization=f"Bearer {access_token}")
+            else:
+                s = session
             try:
-                r.raise_for_status()
-            except requests.exceptions.RequestException as exc:
-                msg = f"{url} {r.status_code} {r.reason}\nError: {exc}\nHeaders:\n"
+                r = self._send(s, method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exc:
+                if not self._can_retry(attempt, idempotent, exc=exc):
+                    raise
+                delay = self._retry_delay(attempt)
+                self.logger.warning("%s %s failed (%s), retrying in %.2fs", method, url, exc, delay)
+            else:
+                if r.status_code == 401 and session is None and not reauthenticated:
+                    # The token was revoked or is stale in the shared store, which it would otherwise stay
+                    # in until it expires. The request was refused, so retrying it is safe.
+                    self.logger.warning("%s %s 401 %s, refreshing the bearer token", method, url, r.reason)
+                    self._invalidate_token(access_token)
+                    reauthenticated = True
+                    continue
+                if r.status_code not in self.retry_statuses or not self._can_retry(attempt, idempotent, response=r):
+                    break
+                delay = self._retry_delay(attempt, response=r)
+                if delay > self.backoff_max:
+                    # Retrying sooner than MEMD asked would only spend the retries during its outage.
+                    self.logger.warning("%s %s %s %s, Retry-After %.0fs is over backoff_max, not retrying",
+                                        method, url, r.status_code, r.reason, delay)
+                    break
+                self.logger.warning("%s %s %s %s, retrying in %.2fs", method, url, r.status_code, r.reason, delay)
+            attempt += 1
+            self.metrics.record_retry(self._metric_name(method, url))
+            time.sleep(delay)
+        if raise_for_status:
+            self._raise_for_status(r, log_body=log_body)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("%s %s %s", r.request.url, r.status_code, r.reason,
+                              extra={"sampled": True, "method": method, "url": r.request.url, "status": r.status_code,
+                                     "latency": r.elapsed.total_seconds(), "attempts": attempt + 1})
+        return r
+
+    def _raise_for_status(self, r, log_body=True):
+        try:
+            r.raise_for_status()
+        except requests.exceptions.RequestException as exc:
+            # Dumping headers and body is only worth it when the record is emitted, bulk runs can fail a lot.
+            if self.logger.isEnabledFor(logging.ERROR):
+                msg = f"{r.url} {r.status_code} {r.reason}\nError: {exc}\nHeaders:\n"
                 for header, value in r.headers.items():
                     msg += f"  {header}: {value}\n"
-                msg += f"Body:\n{r.text}"
-                self.logger.error(msg)
-                raise
-        self.logger.debug(f"{r.request.url} {r.status_code} {r.reason}")
-        return r.json()
+                if log_body:
+                    msg += f"Body:\n{r.text}"
+                self.logger.error("%s", msg, extra={"url": r.url, "status": r.status_code})
+            raise
+
+    def _post_json(self, url, payload, raise_for_status=True):
+        return self._request("POST", url, raise_for_status=raise_for_status, json=payload).json()
 
     def _put_json(self, url, payload, raise_for_status=True):
-        r = self.session.put(url, json=payload)
-        if raise_for_status:
-            try:
-                r.raise_for_status()
-            except requests.exceptions.RequestException as exc:
-                msg = f"{url} {r.status_code} {r.reason}\nError: {exc}\nHeaders:\n"
-                for header, value in r.headers.items():
-                    msg += f"  {header}: {value}\n"
-                msg += f"Body:\n{r.text}"
-                self.logger.error(msg)
-                raise
-        self.logger.debug(f"{r.request.url} {r.status_code} {r.reason}")
-        return r.json()
+        return self._request("PUT", url, raise_for_status=raise_for_status, json=payload).json()
 
     def _get_json(self, url, raise_for_status=True):
-        r = self.session.get(url, headers={"Accept": "application/json"})
+        return self._request("GET", url, raise_for_status=raise_for_status,
+                             headers={"Accept": "application/json"}).json()
+
+    def _member_url(self, external_id):
+        return f"{self.base_url}/v1/partnermember/{external_id}"
+
+    def _get_member_json(self, external_id, raise_for_status=True, not_found_ok=False):
+        """
+        GETs /v1/partnermember/{external_id} through the member cache when it is enabled.
+        Concurrent calls for the same member share one request when single_flight is set.
+        :param not_found_ok: (bool) Return None instead of raising when the member doesn't exist
+        """
+        etag = None
+        if self.member_cache is not None:
+            member_data, etag = self.member_cache.get(external_id)
+            if member_data is not None:
+                return member_data
+        if self.single_flight:
+            (r, frozen), shared = self.flights.do(("member", external_id),
+                                                  lambda: self._fetch_member_frozen(external_id, etag))
+            if shared:
+                self.metrics.record_collapsed("get_member")
+            # Every caller, the leader too, parses its own copy, PrimaryMember edits policies in place.
+            member_data = json.loads(frozen) if frozen is not None else None
+        else:
+            r, member_data = self._fetch_member(external_id, etag)
+        if member_data is not None:
+            return member_data
+        if r.status_code == 404 and not_found_ok:
+            return None
         if raise_for_status:
-            try:
-                r.raise_for_status()
-            except requests.exceptions.RequestException as exc:
-                msg = f"{url} {r.status_code} {r.reason}\nError: {exc}\nHeaders:\n"
-                for header, value in r.headers.items():
-                    msg += f"  {header}: {value}\n"
-                msg += f"Body:\n{r.text}"
-                self.logger.error(msg)
-                raise
-        self.logger.debug(f"{r.request.url} {r.status_code} {r.reason}")
+            self._raise_for_status(r)
         return r.json()
 
-    def validate_member(self, member_dict):
-        validate(member_dict, self.PRIMARY_MEMBER_SCHEMA)
+    def _fetch_member(self, external_id, etag=None):
+        """
+        One GET of a member, conditional on etag when the cache has one, that refreshes the cache and mirror.
+        :return: (response, member_data) member_data is None unless the member was found
+        """
+        headers = {"Accept": "application/json"}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        r = self._request("GET", self._member_url(external_id), raise_for_status=False, headers=headers)
+        if r.status_code == 304 and etag is not None:
+            member_data = self.member_cache.revalidate(external_id)
+            if member_data is not None:
+                return r, member_data
+            # Evicted since the lookup, fetch it unconditionally.
+            return self._fetch_member(external_id)
+        if not r.ok:
+            return r, None
+        member_data = r.json()
+        if self.member_cache is not None:
+            self.member_cache.put(external_id, member_data, r.headers.get("ETag"))
+        self._record_member(member_data)
+        return r, member_data
+
+    def _fetch_member_frozen(self, external_id, etag=None):
+        """
+        _fetch_member for single-flight calls, the member is published as a JSON string so no caller can see
+        another's edits.
+        """
+        r, member_data = self._fetch_member(external_id, etag)
+        return r, json.dumps(member_data) if member_data is not None else None
+
+    def _record_member(self, member_data):
+        if self.mirror is None:
+            return
+        try:
+            self.mirror.record_member(member_data)
+        except Exception as exc:
+            # The mirror is a convenience, a failure to record must never fail the MEMD call itself.
+            self.logger.warning("Unable to record member in mirror: %s", exc)
+
+    def invalidate_member(self, external_id):
+        """
+        Drops a member from the cache, called whenever the member is changed through this client.
+        GETs already in flight are not joined by later callers, they may predate the change.
+        """
+        self.flights.forget(("member", external_id))
+        if self.member_cache is not None:
+            self.member_cache.invalidate(external_id)
+
+    def cache_stats(self):
+        """ Member cache hit/miss counters or None when the cache is disabled. """
+        if self.member_cache is None:
+            return None
+        return self.member_cache.stats()
+
+    @classmethod
+    def get_validator(cls):
+        """ Returns the PRIMARY_MEMBER_SCHEMA validator, checking the schema and compiling it only once. """
+        validator = cls.__dict__.get("_validator")
+        if validator is None:
+            # jsonschema is slow to import and only needed when validating.
+            from jsonschema.validators import validator_for
+            validator_cls = validator_for(cls.PRIMARY_MEMBER_SCHEMA)
+            validator_cls.check_schema(cls.PRIMARY_MEMBER_SCHEMA)
+            validator = validator_cls(cls.PRIMARY_MEMBER_SCHEMA)
+            cls._validator = validator
+        return validator
+
+    @classmethod
+    def validate_member(cls, member_dict):
+        from jsonschema.exceptions import best_match
+        error = best_match(cls.get_validator().iter_errors(member_dict))
+        if error is not None:
+            raise error
+
+    @classmethod
+    def member_errors(cls, member_dict):
+        """
+        Returns every schema error for member_dict as a list of strings, empty if it is valid.
+        """
+        errors = []
+        for error in sorted(cls.get_validator().iter_errors(member_dict), key=lambda e: list(e.absolute_path)):
+            path = "/".join(str(p) for p in error.absolute_path) or "<root>"
+            errors.append(f"{path}: {error.message}")
+        return errors
+
+    @classmethod
+    def validate_many(cls, member_dicts, workers=None, chunk_size=1000):
+        """
+        Validates many members, splitting them into chunks checked in parallel worker processes.
+        :param member_dicts: Iterable of member dicts
+        :param workers: (int) Number of processes, defaults to the cpu count. 1 validates in this process.
+        :param chunk_size: (int) Members per chunk
+        :return: Generator of (index, errors) for every invalid member, in input order
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        chunks = _iter_chunks(member_dicts, chunk_size)
+        if workers == 1:
+            for chunk in chunks:
+                for result in _validate_chunk(cls, chunk):
+                    yield result
+            return
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            for chunk in chunks:
+                pending.append(executor.submit(_validate_chunk, cls, chunk))
+                # Keep a bounded number of chunks in flight so huge rosters aren't loaded all at once.
+                while len(pending) >= workers * 2:
+                    for result in pending.pop(0).result():
+                        yield result
+            for future in pending:
+                for result in future.result():
+                    yield result
 
     def get_primary_member(self, external_id):
-        url = f"{self.base_url}/v1/partnermember/{external_id}"
-        member_data = self._get_json(url, raise_for_status=True)
+        member_data = self._get_member_json(external_id, raise_for_status=True)
         return PrimaryMember(self, **member_data)
 
-    def create_primary_member(self, member_dict):
+    def create_primary_member(self, member_dict, validate=True):
         """
         Creates a new primary member
         :param member_dict: (dict) Member Configuration based on PRIMARY_MEMBER_SCHEMA
+        :param validate: (bool) Set to False if member_dict was already validated
         :return:
         """
-        validate(member_dict, self.PRIMARY_MEMBER_SCHEMA)
+        if validate:
+            self.validate_member(member_dict)
         url = f"{self.base_url}/v1/partnermember"
         member_data = self._post_json(url, member_dict, raise_for_status=True)
+        self._record_member(member_data)
         return PrimaryMember(self, **member_data)
 
+    @staticmethod
+    def _dry_run_member_data(member_dict):
+        """ Shapes a create payload like a /v1/partnermember response for members that were not created. """
+        member_data = dict(member_dict)
+        name = member_data.get("name", {})
+        member_data["name"] = {"first": name.get("First"), "middle": name.get("Middle"), "last": name.get("Last")}
+        member_data["policies"] = []
+        return member_data
+
     def get_or_create_primary_member(self, member_dict, ensure_plancode=True, dry_run=False):
         """
         Either creates a new primary member or retrieves an existing one
         :param member_dict: (dict) Member Configuration based on PRIMARY_MEMBER_SCHEMA
+        :param dry_run: (bool) If set, a missing member is not created and no policies are changed
         :return:
         """
-        validate(member_dict, self.PRIMARY_MEMBER_SCHEMA)
+        self.validate_member(member_dict)
         external_id = member_dict['externalID']
         benefitstart = datetime.datetime.fromisoformat(member_dict['benefitstart'])
         plancode = member_dict["plancode"]
-        url = f"{self.base_url}/v1/partnermember/{external_id}"
-        r = self.session.get(url, headers={"Accept": "application/json"})
-        try:
-            r.raise_for_status()
-        except requests.exceptions.RequestException as exc:
-            self.logger.debug(f"{exc.request.url} {exc.response.status_code} {exc.response.reason}")
-            self.logger.info(f"Primary member with ID {external_id} not found, creating new member.")
-            member = self.create_primary_member(member_dict)
+        member_data = self._get_member_json(external_id, raise_for_status=True, not_found_ok=True)
+        if member_data is None:
+            # Only a definite "not found" creates the member, errors that survived retries are raised.
+            if dry_run:
+                self.logger.info("Primary member with ID %s not found, would create new member.", external_id)
+                member = PrimaryMember(self, **self._dry_run_member_data(member_dict))
+            else:
+                self.logger.info("Primary member with ID %s not found, creating new member.", external_id)
+                member = self.create_primary_member(member_dict, validate=False)
         else:
-            self.logger.info(f"Primary member {external_id} found.")
-            member_data = r.json()
+            self.logger.info("Primary member %s found.", external_id)
             member = PrimaryMember(self, **member_data)
         if ensure_plancode:
-            self.logger.info(f"Ensuring plancode {plancode} benefitstart: {benefitstart}")
+            self.logger.info("Ensuring plancode %s benefitstart: %s", plancode, benefitstart)
             member.ensure_plancode(plancode, benefitstart=benefitstart, dry_run=dry_run)
         return member
+
+
+def _iter_chunks(items, chunk_size):
+    chunk = []
+    start = 0
+    for index, item in enumerate(items):
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield start, chunk
+            start = index + 1
+            chunk = []
+    if chunk:
+        yield start, chunk
+
+
+def _validate_chunk(client_cls, chunk):
+    start, member_dicts = chunk
+    results = []
+    for offset, member_dict in enumerate(member_dicts):
+        errors = client_cls.member_errors(member_dict)
+        if errors:
+            results.append((start + offset, errors))
+    return results
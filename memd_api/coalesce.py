@@ -0,0 +1,92 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MemberPlan(object):
+    """
+    Everything a batch wants done to one member, merged from its operations in file order:
+    an optional create, the field updates merged into one dict (later values win), and the final policy
+    state, either a plancode to have active or None for rm. Only the last add-policy or rm counts.
+    """
+    __slots__ = ("external_id", "indices", "create", "fields", "policy", "operations")
+    UNCHANGED = object()
+
+    def __init__(self, external_id):
+        self.external_id = external_id
+        self.indices = []
+        self.create = None
+        self.fields = {}
+        self.policy = MemberPlan.UNCHANGED
+        self.operations = 0
+
+    def add(self, index, op, params):
+        if op == "create":
+            if self.create is None:
+                self.create = dict(params["member"])
+        elif op == "update":
+            self.fields.update({k: v for k, v in params["fields"].items() if k != "externalID"})
+        elif op == "add_policy":
+            self.policy = params["plancode"]
+        elif op == "rm":
+            self.policy = None
+        elif op != "inspect":
+            raise ValueError(f"Unknown operation {op}")
+        self.indices.append(index)
+        self.operations += 1
+
+    def run(self, client):
+        """
+        Applies the plan with at most one GET or create, one PUT and one policy change.
+        Every step converges, so running a plan again is safe.
+        :return: the member's data afterwards
+        """
+        if self.create is not None:
+            member_dict = dict(self.create)
+            schema_fields = client.PRIMARY_MEMBER_SCHEMA["properties"]
+            # name has a different shape in updates, it is sent with the PUT below instead.
+            member_dict.update({k: v for k, v in self.fields.items() if k in schema_fields and k != "name"})
+            if self.policy not in (MemberPlan.UNCHANGED, None):
+                member_dict["plancode"] = self.policy
+            member = client.get_or_create_primary_member(member_dict, ensure_plancode=False)
+        else:
+            member = client.get_primary_member(self.external_id)
+        fields = {k: v for k, v in self.fields.items() if member._data.get(k) != v}
+        if fields:
+            member.update(**fields)
+        if self.policy is None:
+            member.deactivate_policies()
+        elif self.policy is not MemberPlan.UNCHANGED:
+            member.ensure_plancode(self.policy)
+        return member._data
+
+
+def external_id_of(op, params):
+    if op == "create":
+        return params["member"]["externalID"]
+    return params["external_id"]
+
+
+def coalesce(entries):
+    """
+    Groups (index, op, params) entries by externalID. Dry runs are left out of the plans, which only make
+    real changes, and returned to be run one by one.
+    :return: (plans, rejected, separate) the MemberPlans in order of each member's first operation,
+        (index, exception) for entries that aren't valid operations and the dry run entries
+    """
+    plans = {}
+    rejected = []
+    separate = []
+    for index, op, params in entries:
+        if params.get("dry_run"):
+            separate.append((index, op, params))
+            continue
+        try:
+            external_id = external_id_of(op, params)
+            plan = plans.get(external_id) or MemberPlan(external_id)
+            plan.add(index, op, params)
+            # Only kept once an operation was added, a rejected first operation mustn't leave an empty plan.
+            plans[external_id] = plan
+        except (KeyError, TypeError, ValueError) as exc:
+            rejected.append((index, exc))
+    return list(plans.values()), rejected, separate
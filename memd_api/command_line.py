@@ -3,25 +3,29 @@ import logging
 import configparser
 import json
 import uuid
-import names
 import datetime
 import os
 import shutil
+import time
 
-LOG_FORMAT_STR = '[%(asctime)s][%(name)s:%(levelname)s] %(message)s'
 HOME_DIR = os.path.expanduser("~/.memd_api")
 CONF_DIR = os.path.join(HOME_DIR, "conf")
-if not os.path.isdir(HOME_DIR):
-    os.mkdir(HOME_DIR)
-if not os.path.isdir(CONF_DIR):
-    os.mkdir(CONF_DIR)
 this_dir, this_filename = os.path.split(__file__)
 DEFAULT_API_CONFIG_PATH = os.path.join(this_dir, "data", "api.ini")
 DEFAULT_JSON_CONFIG_PATH = os.path.join(this_dir, "data", "defaults.json")
-if not os.path.isfile(os.path.join(CONF_DIR, "api.ini")):
-    shutil.copyfile(DEFAULT_API_CONFIG_PATH, os.path.join(CONF_DIR, "api.ini"))
-if not os.path.isfile(os.path.join(CONF_DIR, "defaults.json")):
-    shutil.copyfile(DEFAULT_JSON_CONFIG_PATH, os.path.join(CONF_DIR, "defaults.json"))
+
+
+def conf_file(filename):
+    """ Path of filename in CONF_DIR, copied from the packaged data the first time a command needs it. """
+    path = os.path.join(CONF_DIR, filename)
+    if not os.path.isfile(path):
+        os.makedirs(CONF_DIR, exist_ok=True)
+        shutil.copyfile(os.path.join(this_dir, "data", filename), path)
+    return path
+
+
+def default_defaults_path():
+    return conf_file("defaults.json")
 
 
 def load_config(config_file=None):
@@ -45,56 +49,59 @@ def load_config(config_file=None):
 @click.option("-l", "--log-level",
               type=click.Choice(["debug", "info", "warning", "critical", "null"], case_sensitive=False),
               default="warning", show_default=True)
+@click.option("--log-format", type=click.Choice(["text", "json"]), default="text", show_default=True,
+              help="json writes one object per record, with fields like endpoint, status and latency.")
+@click.option("--log-sample", type=click.IntRange(min=1), default=1, show_default=True,
+              help="Keep 1 in N per-request debug records.")
 @click.option("-m", "--mode", type=click.Choice(["prod", "test"], case_sensitive=False), default="prod",
               show_default=True, help="In test mode, output is written to files.")
-@click.option("--api-config", type=click.Path(), required=True, default=os.path.join(CONF_DIR, "api.ini"),
-              show_default=True)
+@click.option("--api-config", type=click.Path(), show_default=os.path.join(CONF_DIR, "api.ini"))
 @click.option("--output-directory", type=click.Path(), default=HOME_DIR, show_default=True,
               help="Where to store files in test mode.")
+@click.option("--token-cache/--no-token-cache", default=True, show_default=True,
+              help="Share bearer tokens between invocations through ~/.memd_api/tokens.")
+@click.option("--mirror/--no-mirror", default=True, show_default=True,
+              help="Record members seen through the API in ~/.memd_api/members.db for member ls.")
+@click.option("--metrics-out", type=click.Path(dir_okay=False),
+              help="Write request metrics here when the command finishes, JSON for *.json, else Prometheus text.")
+@click.option("--daemon/--no-daemon", default=True, show_default=True,
+              help="Forward create, inspect, update, add-policy and rm to `memd-api serve` when it is running.")
+@click.option("--socket", "socket_path", type=click.Path(), default=os.path.join(HOME_DIR, "memd_api.sock"),
+              show_default=True, help="Unix socket of `memd-api serve`.")
 @click.pass_context
-def cli(ctx, log_level, mode, api_config, output_directory):
+def cli(ctx, log_level, log_format, log_sample, mode, api_config, output_directory, token_cache, mirror, metrics_out,
+        daemon, socket_path):
     ctx.ensure_object(dict)
-    if api_config:
-        if not os.path.isfile(api_config):
-            shutil.copyfile(DEFAULT_API_CONFIG_PATH, api_config)
-    api_config_data = load_config(api_config)
-    for _ in ("base_url", "username", "password", "client_id", "client_secret"):
-        if not api_config_data.get("api", {}).get(_):
-            raise click.BadOptionUsage("api_config", f"api_config missing {_}")
-    ctx.obj["api_config"] = api_config_data
+    ctx.obj["daemon"] = daemon
+    ctx.obj["socket_path"] = socket_path
+    ctx.obj["token_cache"] = token_cache
+    ctx.obj["mirror"] = mirror
+    if metrics_out:
+        from .metrics import MetricsRegistry
+        metrics = ctx.obj["metrics"] = MetricsRegistry()
+        ctx.call_on_close(lambda: metrics.write(metrics_out))
+    ctx.obj["api_config_path"] = api_config
     ctx.obj["mode"] = mode
+    from .log import configure_logging, stop_logging
+    level_map = {
+        "debug": logging.DEBUG,
+        "info": logging.INFO,
+        "warning": logging.WARNING,
+        "critical": logging.CRITICAL,
+        "null": logging.CRITICAL + 1
+    }
+    # The root level filters, so disabled records are dropped before their message is built.
+    configure_logging(level_map[log_level], fmt=log_format, sample_every=log_sample)
+    ctx.call_on_close(stop_logging)
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
-    if log_level == "null":
-        handler = logging.NullHandler()
-        logger.addHandler(handler)
-    else:
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter(LOG_FORMAT_STR)
-        handler.setFormatter(formatter)
-        level_map = {
-            "debug": logging.DEBUG,
-            "info": logging.INFO,
-            "warning": logging.WARNING,
-            "critical": logging.CRITICAL
-        }
-        handler.setLevel(level_map[log_level])
-        logger.addHandler(handler)
 
+    # Test mode records go to the RecordStore, see get_record_store. The per-member JSON file directories of
+    # earlier versions are only read, as a fallback for lookups.
     ctx.obj["output_directory"] = output_directory
-    os.makedirs(ctx.obj["output_directory"], exist_ok=True)
-    create_dir = os.path.join(ctx.obj["output_directory"], "create")
-    response_dir = os.path.join(ctx.obj["output_directory"], "response")
-    update_dir = os.path.join(ctx.obj["output_directory"], "update")
-    current_dir = os.path.join(ctx.obj["output_directory"], "current")
-    os.makedirs(create_dir, exist_ok=True)
-    os.makedirs(response_dir, exist_ok=True)
-    os.makedirs(update_dir, exist_ok=True)
-    os.makedirs(current_dir, exist_ok=True)
-    ctx.obj["create_dir"] = create_dir
-    ctx.obj["response_dir"] = response_dir
-    ctx.obj["update_dir"] = update_dir
-    ctx.obj["current_dir"] = current_dir
+    ctx.obj["create_dir"] = os.path.join(output_directory, "create")
+    ctx.obj["response_dir"] = os.path.join(output_directory, "response")
+    ctx.obj["update_dir"] = os.path.join(output_directory, "update")
+    ctx.obj["current_dir"] = os.path.join(output_directory, "current")
     ctx.obj["logger"] = logger
 
 
@@ -104,6 +111,108 @@ def member(ctx):
     pass
 
 
+def get_record_store(ctx):
+    """ The test mode RecordStore in --output-directory, flushed and closed when the command finishes. """
+    if ctx.obj.get("record_store") is None:
+        from .record_store import RecordStore
+        store = ctx.obj["record_store"] = RecordStore(os.path.join(ctx.obj["output_directory"], "records.db"))
+        ctx.call_on_close(store.close)
+    return ctx.obj["record_store"]
+
+
+def find_record(ctx, name, kinds):
+    """
+    Loads name if it is a JSON file, otherwise looks it up as "first_last" (.json optional) among the
+    records of kinds, falling back to per-member files left in the output directories by earlier versions.
+    :return: (str, dict) the "first_last" name key (or None for files) and the record, or (None, None)
+    """
+    if os.path.isfile(name):
+        return None, next(iter_json_files(name), None)
+    key = name[:-len(".json")] if name.endswith(".json") else name
+    data = get_record_store(ctx).latest(name=key, kinds=kinds)
+    if data is None:
+        data = next(iter_json_files(key + ".json", dirs_to_check=[ctx.obj[f"{kind}_dir"] for kind in kinds]), None)
+    return (key, data) if data is not None else (None, None)
+
+
+def get_api_config(ctx):
+    """ Parses --api-config on first use, copying the packaged api.ini there if the file doesn't exist. """
+    if "api_config" not in ctx.obj:
+        api_config = ctx.obj.get("api_config_path")
+        if api_config is None:
+            api_config = conf_file("api.ini")
+        elif not os.path.isfile(api_config):
+            shutil.copyfile(DEFAULT_API_CONFIG_PATH, api_config)
+        ctx.obj["api_config"] = load_config(api_config)
+    return ctx.obj["api_config"]
+
+
+def get_client_config(ctx, workers=None):
+    """
+    The Client dict_config from the api config, only commands that talk to MEMD need the credentials.
+    :param workers: (int) If set, the connection pool is sized so that many threads can share the client
+    """
+    api_config_data = get_api_config(ctx)
+    for _ in ("base_url", "username", "password", "client_id", "client_secret"):
+        if not api_config_data.get("api", {}).get(_):
+            raise click.BadOptionUsage("api_config", f"api_config missing {_}")
+    dict_config = dict(api_config_data["api"])
+    if workers is not None:
+        dict_config["pool_maxsize"] = max(workers, int(dict_config.get("pool_maxsize") or 0))
+    return dict_config
+
+
+def get_client(ctx, workers=None):
+    """ Builds a Client from the api config, see get_client_config. """
+    dict_config = get_client_config(ctx, workers=workers)
+    from .client import Client
+    token_store = None
+    if ctx.obj.get("token_cache", True):
+        from .token_store import FileTokenStore
+        token_store = FileTokenStore(os.path.join(HOME_DIR, "tokens"))
+    return Client(dict_config, token_store=token_store, mirror=get_mirror(ctx), metrics=ctx.obj.get("metrics"))
+
+
+def api_key(ctx):
+    """ Identifies the api config (base_url, username, client_id) so the daemon only serves matching callers. """
+    api = get_api_config(ctx).get("api", {})
+    if not all(api.get(_) for _ in ("base_url", "username", "client_id")):
+        return None
+    from .token_store import FileTokenStore
+    return FileTokenStore.key_for(api["base_url"], api["username"], api["client_id"])
+
+
+def run_operation(ctx, op, **params):
+    """
+    Runs one of memd_api.operations through `memd-api serve` when it is running for the same api config,
+    otherwise in this process.
+    """
+    logger = ctx.obj["logger"]
+    key = api_key(ctx)
+    if ctx.obj.get("daemon", True) and key is not None:
+        from .daemon import DaemonError, DaemonUnavailable, send
+        try:
+            result = send(ctx.obj["socket_path"], key, op, params)
+            logger.debug("%s ran in the daemon", op)
+            return result
+        except DaemonUnavailable as exc:
+            logger.debug("Running %s locally: %s", op, exc)
+        except DaemonError as exc:
+            raise click.ClickException(str(exc))
+    from . import operations
+    return operations.run(get_client(ctx), op, params)
+
+
+def get_mirror(ctx):
+    """ The local member mirror, shared by every client of this invocation, or None if disabled. """
+    if not ctx.obj.get("mirror", True):
+        return None
+    if ctx.obj.get("mirror_instance") is None:
+        from .mirror import MemberMirror
+        ctx.obj["mirror_instance"] = MemberMirror(os.path.join(HOME_DIR, "members.db"))
+    return ctx.obj["mirror_instance"]
+
+
 def validate_uuid(ctx, param, value):
     if value:
         try:
@@ -118,7 +227,6 @@ def iter_json_files(filename, dirs_to_check=[], include_filepath=False):
         paths_to_check.append(filename)
     else:
         for d in dirs_to_check:
-            os.makedirs(d, exist_ok=True)
             fpath = os.path.join(d, filename)
             if os.path.isfile(fpath):
                 paths_to_check.append(fpath)
@@ -136,7 +244,8 @@ def iter_json_files(filename, dirs_to_check=[], include_filepath=False):
 
 
 @member.command()
-@click.option("--defaults", type=click.Path(exists=True), default=os.path.join(CONF_DIR, "defaults.json"), show_default=True)
+@click.option("--defaults", type=click.Path(exists=True), default=default_defaults_path,
+              show_default=os.path.join(CONF_DIR, "defaults.json"))
 @click.option("--from-json", type=click.Path())
 @click.option("--external-id", type=click.UNPROCESSED, callback=validate_uuid)
 @click.option("--first-name", type=str)
@@ -155,26 +264,27 @@ def create(ctx, defaults, from_json, external_id, first_name, last_name, email,
         except Exception as exc:
             raise click.BadOptionUsage("defaults", str(exc))
     if from_json:
-        for json_data in iter_json_files(from_json, dirs_to_check=[ctx.obj["create_dir"]]):
-            options.update(json_data)
-            break
-        else:
+        _, json_data = find_record(ctx, from_json, ("create",))
+        if json_data is None:
             raise click.BadOptionUsage("from_json", "File Not Found")
+        options.update(json_data)
     if external_id is not None:
         options.update(externalID=external_id)
     elif "externalID" not in options:
         external_id=str(uuid.uuid4())
-        logger.debug(f"Generated external id {external_id}")
+        logger.debug("Generated external id %s", external_id)
         options.update(externalID=external_id)
     if "name" not in options:
         options["name"] = {}
     if first_name is not None:
         options["name"]["First"] = first_name
     elif "First" not in options["name"]:
+        import names
         options["name"]["First"] = names.get_first_name()
     if last_name is not None:
         options["name"]["Last"] = last_name
     elif "Last" not in options["name"]:
+        import names
         options["name"]["Last"] = names.get_last_name()
     if email is not None:
         options["email"] = email
@@ -188,30 +298,24 @@ def create(ctx, defaults, from_json, external_id, first_name, last_name, email,
     if "plancode" not in options:
         options.update(plancode=plan_code)
 
-    logger.debug(f"Created Member Payload:\n{json.dumps(options, indent=4)}")
+    from .log import LazyJson
+    logger.debug("Created Member Payload:\n%s", LazyJson(options))
 
-    from .client import Client
-    client = Client(ctx.obj["api_config"]["api"])
-    client.validate_member(options)
-    logger.debug("Validated Payload")
-    filename = "%s_%s.json" % (options["name"]["First"].lower(), options["name"]["Last"].lower())
+    # Otherwise the create operation validates, keeping jsonschema out of the daemon forwarding path.
+    if dry_run or ctx.obj["mode"] == 'test':
+        from .client import Client
+        Client.validate_member(options)
+        logger.debug("Validated Payload")
     if ctx.obj["mode"] == 'test':
-        with open(os.path.join(ctx.obj["create_dir"], filename), "w") as fp:
-            json.dump(options, fp, indent=4)
+        get_record_store(ctx).record("create", options)
     if dry_run:
         #click.echo(json.dumps(options, indent=4))
         click.echo(options["externalID"])
     else:
-        from .client import Client
-        client = Client(ctx.obj["api_config"]["api"])
-        logger.debug("Client Token: %s" % client.access_token)
-        member = client.create_primary_member(options)
-        member_data = member._data
+        member_data = run_operation(ctx, "create", member=options)
         if ctx.obj["mode"] == 'test':
-            with open(os.path.join(ctx.obj["response_dir"], filename), "w") as fp:
-                json.dump(member_data, fp, indent=4)
-            with open(os.path.join(ctx.obj["current_dir"], filename), "w") as fp:
-                json.dump(member_data, fp, indent=4)
+            get_record_store(ctx).record("response", member_data)
+            get_record_store(ctx).record("current", member_data)
         click.echo(member_data["externalID"])
 
 
@@ -220,14 +324,13 @@ def create(ctx, defaults, from_json, external_id, first_name, last_name, email,
 @click.pass_context
 def get_id(ctx, json_filename):
     logger = ctx.obj["logger"]
-    logger.debug(f"Getting id from {json_filename}")
-    for json_data in iter_json_files(
-            json_filename, dirs_to_check=[ctx.obj["current_dir"], ctx.obj["create_dir"], ctx.obj["response_dir"]]):
-        if "externalID" in json_data:
-            click.echo(json_data["externalID"])
-            break
-    else:
+    logger.debug("Getting id from %s", json_filename)
+    key, json_data = find_record(ctx, json_filename, ("current", "create", "response"))
+    if json_data is None or "externalID" not in json_data:
         raise click.BadOptionUsage("from_json", "File Not Found")
+    if key is not None and len(get_record_store(ctx).external_ids(key)) > 1:
+        logger.warning("Several members are recorded as %s, using the most recent", key)
+    click.echo(json_data["externalID"])
 
 
 @member.command()
@@ -236,26 +339,42 @@ def get_id(ctx, json_filename):
 @click.pass_context
 def inspect(ctx, external_id, refresh_current):
     logger = ctx.obj["logger"]
-    logger.debug(f"Inspecting Primary Member {external_id}")
-    from .client import Client
-    client = Client(ctx.obj["api_config"]["api"])
-    logger.debug("Client Token: %s" % client.access_token)
-    member = client.get_primary_member(external_id)
-    member_data = member._data
+    logger.debug("Inspecting Primary Member %s", external_id)
+    member_data = run_operation(ctx, "inspect", external_id=external_id)
     if refresh_current:
-        filename = "%s_%s.json" % (member.name.first.lower(), member.name.last.lower())
-        current_filepath = os.path.join(ctx.obj["current_dir"], filename)
-        with open(current_filepath, "w") as fp:
-            json.dump(member_data, fp, indent=4)
+        get_record_store(ctx).record("current", member_data)
     click.echo(json.dumps(member_data, indent=4, default=str))
 
 
 @member.command()
+@click.option("--plancode", type=str, help="Only members with this plancode active.")
+@click.option("--inactive", is_flag=True, help="Only members without an active policy.")
+@click.option("--email", type=str)
+@click.option("--name", type=str, help="\"First Last\", or a single first or last name.")
+@click.option("--limit", type=click.IntRange(min=1), default=50, show_default=True)
+@click.option("--offset", type=click.IntRange(min=0), default=0, show_default=True)
+@click.option("--after", type=str, help="Page after this externalID, faster than --offset for deep pages.")
+@click.option("--count", "count_only", is_flag=True, help="Only print the number of matching members.")
+@click.option("--json", "as_json", is_flag=True, help="Print full member documents as NDJSON.")
 @click.pass_context
-def ls(ctx):
+def ls(ctx, plancode, inactive, email, name, limit, offset, after, count_only, as_json):
+    """ Lists members from the local mirror without calling MEMD. """
     logger = ctx.obj["logger"]
     logger.debug("Listing Primary Members Invoked")
-    click.echo("Listing Primary Members")
+    mirror = get_mirror(ctx)
+    if mirror is None:
+        raise click.UsageError("member ls reads the local mirror, it can't be used with --no-mirror")
+    filters = dict(plancode=plancode, inactive=inactive, email=email, name=name)
+    if count_only:
+        click.echo(mirror.count(**filters))
+        return
+    for member_data in mirror.iter_members(limit=limit, offset=offset, after=after, full=as_json, **filters):
+        if as_json:
+            click.echo(json.dumps(member_data, default=str))
+        else:
+            full_name = " ".join(n for n in (member_data["first"], member_data["last"]) if n)
+            click.echo("\t".join([member_data["externalID"], full_name, member_data["email"] or "",
+                                  member_data["active_plancode"] or "-"]))
 
 
 def validate_jsonstr(ctx, param, value):
@@ -281,27 +400,18 @@ def update(ctx, external_id, json_string, json_file, dry_run):
     if json_string:
         update_data = json_string
     elif json_file:
-        for filepath, json_data in iter_json_files(json_file, dirs_to_check=[ctx.obj["update_dir"]], include_filepath=True):
-            update_data = json_data
-            break
-        else:
+        _, update_data = find_record(ctx, json_file, ("update",))
+        if update_data is None:
             raise click.BadOptionUsage("json_file", "File Not Found")
     if update_data is None:
         raise click.UsageError("--json-string or --json-file required")
-    from .client import Client
-    client = Client(ctx.obj["api_config"]["api"])
-    logger.debug("Client Token: %s" % client.access_token)
-    member = client.get_primary_member(external_id)
     if "externalID" in update_data:
         del update_data["externalID"]
-    response_data = member.update(dry_run=dry_run, **update_data)
+    response_data = run_operation(ctx, "update", external_id=external_id, fields=update_data, dry_run=dry_run)
     response_data.update(externalID=external_id)
     if ctx.obj["mode"] == 'test':
-        with open(filepath, "w") as fp:
-            json.dump(response_data, fp, indent=4)
-        current_filepath = os.path.join(ctx.obj["current_dir"], os.path.basename(filepath))
-        with open(current_filepath, "w") as fp:
-            json.dump(response_data, fp, indent=4)
+        get_record_store(ctx).record("update", response_data)
+        get_record_store(ctx).record("current", response_data)
     click.echo(json.dumps(response_data, indent=4))
 
 @member.command()
@@ -312,16 +422,10 @@ def update(ctx, external_id, json_string, json_file, dry_run):
 def add_policy(ctx, external_id, plancode, dry_run):
     logger = ctx.obj["logger"]
     logger.debug("Create Policy Command Invoked")
-    from .client import Client
-    client = Client(ctx.obj["api_config"]["api"])
-    logger.debug("Client Token: %s" % client.access_token)
-    member = client.get_primary_member(external_id)
-    response = member.create_policy(plancode, dry_run=dry_run)
-    filename = "%s_%s.json" % (member.name.first.lower(), member.name.last.lower())
-    current_filepath = os.path.join(ctx.obj["current_dir"], filename)
+    result = run_operation(ctx, "add_policy", external_id=external_id, plancode=plancode, dry_run=dry_run)
+    response, member_data = result["response"], result["member"]
     if ctx.obj["mode"] == 'test':
-        with open(current_filepath, "w") as fp:
-            json.dump(member._data, fp, indent=4)
+        get_record_store(ctx).record("current", member_data)
     click.echo(json.dumps(response, indent=4))
 
 
@@ -332,9 +436,297 @@ def add_policy(ctx, external_id, plancode, dry_run):
 def rm(ctx, external_id, dry_run):
     logger = ctx.obj["logger"]
     logger.debug("Remove Policy Command Invoked")
-    from .client import Client
-    client = Client(ctx.obj["api_config"]["api"])
-    member = client.get_primary_member(external_id)
-    response = member.deactivate_policies(dry_run=dry_run)
+    response = run_operation(ctx, "rm", external_id=external_id, dry_run=dry_run)
     click.echo(json.dumps(response, indent=4))
 
+
+
+def member_payload(row, base, plan_code):
+    """ row on top of the --defaults values, with benefitstart (today) and plancode filled in if missing. """
+    options = dict(base)
+    options.update(row)
+    if "benefitstart" not in options:
+        options.update(benefitstart=datetime.datetime.today().replace(hour=0).replace(minute=0).replace(
+            second=0).replace(microsecond=0).isoformat())
+    if "plancode" not in options:
+        options.update(plancode=plan_code)
+    return options
+
+
+def iter_roster_payloads(roster, defaults, plan_code):
+    from .bulk import iter_roster
+    base = load_config(defaults) if defaults else {}
+    for row in iter_roster(roster):
+        yield member_payload(row, base, plan_code)
+
+
+@member.command()
+@click.option("--roster", type=click.Path(exists=True), required=True,
+              help="JSON list or NDJSON file of members based on PRIMARY_MEMBER_SCHEMA.")
+@click.option("--defaults", type=click.Path(exists=True), default=default_defaults_path,
+              show_default=os.path.join(CONF_DIR, "defaults.json"))
+@click.option("--plan-code", type=str, default="DWA57Q83", show_default=True,
+              help="Plancode for rows that don't set one.")
+@click.option("--workers", type=click.IntRange(min=1), default=8, show_default=True,
+              help="Threads, per process with --processes.")
+@click.option("--processes", type=click.IntRange(min=1), default=1, show_default=True,
+              help="Worker processes, members are sharded between them by externalID.")
+@click.option("--rate-limit", type=click.FloatRange(min=0), default=None,
+              help="Requests per second across all processes, defaults to the api config rate_limit.")
+@click.option("--dry-run", is_flag=True)
+@click.pass_context
+def sync(ctx, roster, defaults, plan_code, workers, processes, rate_limit, dry_run):
+    logger = ctx.obj["logger"]
+    logger.debug("Sync Roster Invoked")
+    rows = iter_roster_payloads(roster, defaults, plan_code)
+    if processes == 1:
+        from .bulk import sync_roster
+        client = get_client(ctx, workers=workers)
+        if rate_limit is not None:
+            from .throttle import RateLimiter
+            client.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        summary = sync_roster(client, rows, workers=workers, dry_run=dry_run)
+        click.echo(json.dumps(summary.as_dict(), indent=4))
+        if summary.failed:
+            ctx.exit(1)
+        return
+    from .sharding import sync_roster_sharded
+    dict_config = get_client_config(ctx, workers=workers)
+    if rate_limit is None:
+        rate_limit = float(dict_config.get("rate_limit") or 0)
+    # The shared limiter replaces the per-process one.
+    dict_config["rate_limit"] = 0
+    token_dir = os.path.join(HOME_DIR, "tokens") if ctx.obj.get("token_cache", True) else None
+    mirror_path = os.path.join(HOME_DIR, "members.db") if ctx.obj.get("mirror", True) else None
+    summary, _, shards = sync_roster_sharded(dict_config, rows, processes=processes, workers=workers,
+                                             dry_run=dry_run, token_dir=token_dir, mirror_path=mirror_path,
+                                             rate_limit=rate_limit, metrics=ctx.obj.get("metrics"))
+    report = summary.as_dict()
+    report["shards"] = shards
+    click.echo(json.dumps(report, indent=4))
+    if summary.failed or any("error" in shard for shard in shards):
+        ctx.exit(1)
+
+
+@member.command()
+@click.option("--ids", "ids_path", type=click.Path(exists=True), required=True,
+              help="File with one externalID per line.")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True, allow_dash=True), default="-",
+              show_default=True, help="NDJSON output file, - for stdout.")
+@click.option("--policies", is_flag=True, help="Write policies as separate flattened records.")
+@click.option("--ordered", is_flag=True, help="Keep output in the order of the ids file.")
+@click.option("--workers", type=click.IntRange(min=1), default=8, show_default=True)
+@click.pass_context
+def export(ctx, ids_path, output, policies, ordered, workers):
+    """ Streams members (and optionally their policies) as compact NDJSON. """
+    logger = ctx.obj["logger"]
+    logger.debug("Export Members Invoked")
+    from .bulk import export_members, iter_ids
+    client = get_client(ctx, workers=workers)
+    with click.open_file(output, "w") as fp:
+        exported, failed = export_members(client, iter_ids(ids_path), fp, workers=workers, ordered=ordered,
+                                          policies=policies)
+    click.echo(f"Exported {exported} member(s), {failed} failed", err=True)
+    if failed:
+        ctx.exit(1)
+
+
+@member.command()
+@click.option("--count", type=click.IntRange(min=1), required=True, help="Number of members.")
+@click.option("--seed", type=int, help="Random seed, the same seed gives the same members.")
+@click.option("--start", type=click.IntRange(min=0), default=0, show_default=True,
+              help="Index of the first row, to generate a population in parts with one seed.")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True, allow_dash=True), default="-",
+              show_default=True, help="NDJSON output file, - for stdout.")
+@click.option("--defaults", type=click.Path(exists=True), default=default_defaults_path,
+              show_default=os.path.join(CONF_DIR, "defaults.json"), help="Base payload of every member.")
+@click.option("--plan-code", type=str, default="DWA57Q83", show_default=True)
+@click.pass_context
+def generate(ctx, count, seed, start, output, defaults, plan_code):
+    """ Writes synthetic members as an NDJSON roster for sync, validate or batch, without contacting MEMD. """
+    logger = ctx.obj["logger"]
+    logger.debug("Generate Members Invoked")
+    from .generate import MemberGenerator
+    base = member_payload({}, load_config(defaults) if defaults else {}, plan_code)
+    generator = MemberGenerator(seed=seed, base=base)
+    started = time.monotonic()
+    with click.open_file(output, "w") as fp:
+        written = generator.write(fp, count, start=start)
+    elapsed = time.monotonic() - started
+    click.echo(f"Generated {written} member(s) with seed {generator.seed} in {elapsed:.2f}s", err=True)
+
+
+@member.command()
+@click.argument("ops", type=click.Path(exists=True, dir_okay=False))
+@click.option("--journal", "journal_path", type=click.Path(dir_okay=False),
+              help="Journal of started and completed operations, defaults to OPS.journal.")
+@click.option("--resume", is_flag=True,
+              help="Skip operations the journal has as completed, safely retry in-flight and failed ones.")
+@click.option("--defaults", type=click.Path(exists=True), default=default_defaults_path,
+              show_default=os.path.join(CONF_DIR, "defaults.json"), help="Base payload for create operations.")
+@click.option("--plan-code", type=str, default="DWA57Q83", show_default=True,
+              help="Plancode for create operations that don't set one.")
+@click.option("--coalesce", is_flag=True,
+              help="Merge each member's operations into one create/update/policy plan, reads the whole file first.")
+@click.option("--workers", type=click.IntRange(min=1), default=8, show_default=True)
+@click.pass_context
+def batch(ctx, ops, journal_path, resume, defaults, plan_code, coalesce, workers):
+    """
+    Runs the operations in OPS, one JSON object per line, e.g.
+
+    {"op": "update", "external_id": "...", "fields": {"phone": "..."}}
+
+    Operations are create (member), inspect, update (fields), add-policy (plancode) and rm.
+    Without --coalesce, operations on the same member can run concurrently and in any order.
+    """
+    logger = ctx.obj["logger"]
+    logger.debug("Batch Invoked")
+    from .bulk import run_batch
+    from .journal import Journal
+    journal_path = journal_path or ops + ".journal"
+    if os.path.exists(journal_path) and not resume:
+        raise click.UsageError(f"Journal {journal_path} exists, pass --resume to continue it or remove it")
+    base = load_config(defaults) if defaults else {}
+
+    def prepare(op, params):
+        if op == "create":
+            params["member"] = member_payload(params["member"], base, plan_code)
+        return params
+
+    client = get_client(ctx, workers=workers)
+    summary, stats = run_batch(client, ops, Journal(journal_path), workers=workers, resume=resume,
+                               prepare=prepare, coalesce=coalesce)
+    result = summary.as_dict()
+    result.update(stats)
+    click.echo(json.dumps(result, indent=4))
+    if summary.failed:
+        ctx.exit(1)
+
+
+@member.command()
+@click.argument("roster", type=click.Path(exists=True))
+@click.option("--defaults", type=click.Path(exists=True), default=default_defaults_path,
+              show_default=os.path.join(CONF_DIR, "defaults.json"))
+@click.option("--plan-code", type=str, default="DWA57Q83", show_default=True,
+              help="Plancode for rows that don't set one.")
+@click.option("--workers", type=click.IntRange(min=1), default=None,
+              help="Validation processes, defaults to the cpu count.")
+@click.option("--chunk-size", type=click.IntRange(min=1), default=1000, show_default=True)
+@click.pass_context
+def validate(ctx, roster, defaults, plan_code, workers, chunk_size):
+    """ Validates every row of ROSTER against PRIMARY_MEMBER_SCHEMA without contacting MEMD. """
+    logger = ctx.obj["logger"]
+    logger.debug("Validate Roster Invoked")
+    from .client import Client
+    invalid = 0
+    for index, errors in Client.validate_many(iter_roster_payloads(roster, defaults, plan_code),
+                                              workers=workers, chunk_size=chunk_size):
+        invalid += 1
+        for error in errors:
+            click.echo(f"row {index + 1}: {error}")
+    if invalid:
+        click.echo(f"{invalid} invalid row(s) in {roster}", err=True)
+        ctx.exit(1)
+    click.echo(f"All rows in {roster} are valid")
+
+
+@cli.command()
+@click.option("--workers", type=click.IntRange(min=1), default=16, show_default=True,
+              help="Connection pool size, requests are served on a thread each.")
+@click.pass_context
+def serve(ctx, workers):
+    """ Serves create, inspect, update, add-policy and rm from one warm client on --socket. """
+    import signal
+    from .daemon import MemdDaemon
+    logger = ctx.obj["logger"]
+    client = get_client(ctx, workers=workers)
+    client.access_token
+    try:
+        daemon = MemdDaemon(client, api_key(ctx), ctx.obj["socket_path"])
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc))
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.shutdown())
+    click.echo(f"Serving on {ctx.obj['socket_path']}", err=True)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Interrupted, shutting down")
+
+
+def format_interval(report):
+    latency = report["latency_seconds"]
+    return (f"{report['elapsed']:7.1f}s {report['throughput']:9.1f} ops/s  errors {report['error_rate']:6.2%}  "
+            f"p50 {latency['p50'] * 1000:8.1f}ms  p90 {latency['p90'] * 1000:8.1f}ms  "
+            f"p99 {latency['p99'] * 1000:8.1f}ms  max {latency['max'] * 1000:8.1f}ms")
+
+
+@cli.command()
+@click.option("--model", type=click.Choice(["closed", "open"]), default="closed", show_default=True,
+              help="closed: --concurrency workers back to back. open: --rate operations per second.")
+@click.option("--rate", type=click.FloatRange(min=0, min_open=True), help="Target operations per second, open model.")
+@click.option("--concurrency", type=click.IntRange(min=1), default=16, show_default=True,
+              help="Workers, the most operations in flight for the open model.")
+@click.option("--duration", type=click.FloatRange(min=0, min_open=True), default=30.0, show_default=True,
+              help="Seconds.")
+@click.option("--interval", type=click.FloatRange(min=0, min_open=True), default=5.0, show_default=True,
+              help="Seconds between progress reports.")
+@click.option("--mix", type=str, default="get=70,update=15,create=10,policy=5", show_default=True,
+              help="Weights of the get, create, update and policy operations.")
+@click.option("--prepopulate", type=click.IntRange(min=0), default=100, show_default=True,
+              help="Members to create before the test for get, update and policy.")
+@click.option("--seed", type=int, help="Seed for the generated members and the operation sequence.")
+@click.option("--defaults", type=click.Path(exists=True), default=default_defaults_path,
+              show_default=os.path.join(CONF_DIR, "defaults.json"), help="Base payload of created members.")
+@click.option("--plan-code", type=str, default="DWA57Q83", show_default=True)
+@click.option("--fake-server", is_flag=True, help="Run against an in-process FakeMemdServer instead of --api-config.")
+@click.option("--fake-latency", type=click.FloatRange(min=0), default=0.0, show_default=True,
+              help="Seconds the fake server adds to every response.")
+@click.option("--fake-error-rate", type=click.FloatRange(min=0, max=1), default=0.0, show_default=True,
+              help="Fraction of fake server responses that are 503s.")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True, allow_dash=True), default="-",
+              show_default=True, help="Where to write the JSON report, - for stdout.")
+@click.pass_context
+def loadtest(ctx, model, rate, concurrency, duration, interval, mix, prepopulate, seed, defaults, plan_code,
+             fake_server, fake_latency, fake_error_rate, output):
+    """
+    Drives a mix of member operations and reports throughput, errors and latency percentiles, every
+    --interval on stderr and for the whole run as JSON. Creates real members unless --fake-server is set.
+    """
+    logger = ctx.obj["logger"]
+    logger.debug("Load Test Invoked")
+    from .generate import MemberGenerator
+    from .loadtest import LoadTest, parse_mix
+    try:
+        weights = parse_mix(mix)
+    except ValueError as exc:
+        raise click.BadOptionUsage("mix", str(exc))
+    if model == "open" and rate is None:
+        raise click.BadOptionUsage("rate", "--rate is required with --model open")
+    base = member_payload({}, load_config(defaults) if defaults else {}, plan_code)
+    server = None
+    if fake_server:
+        from .client import Client
+        from .fake_server import FakeMemdServer
+        server = FakeMemdServer(latency=fake_latency, error_rate=fake_error_rate, seed=seed).start()
+        ctx.call_on_close(server.stop)
+        client = Client(server.dict_config(pool_maxsize=concurrency), metrics=ctx.obj.get("metrics"))
+    else:
+        client = get_client(ctx, workers=concurrency)
+    client.access_token
+    test = LoadTest(client, weights, MemberGenerator(seed=seed, base=base), plan_code=plan_code, seed=seed)
+    if prepopulate:
+        click.echo(f"Creating {prepopulate} member(s)", err=True)
+        failed = test.prepopulate(prepopulate, workers=concurrency)
+        if failed:
+            click.echo(f"{failed} member(s) could not be created", err=True)
+
+    def on_interval(report):
+        click.echo(format_interval(report), err=True)
+
+    click.echo(f"Running the {model} model for {duration:g}s against {client.base_url}", err=True)
+    if model == "open":
+        result = test.run_open(rate, duration, max_in_flight=concurrency, interval=interval, on_interval=on_interval)
+    else:
+        result = test.run_closed(concurrency, duration, interval=interval, on_interval=on_interval)
+    with click.open_file(output, "w") as fp:
+        fp.write(json.dumps(result, indent=4) + "\n")
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+
+from . import operations
+
+DEFAULT_SOCKET_PATH = os.path.join(os.path.expanduser("~/.memd_api"), "memd_api.sock")
+
+
+class DaemonUnavailable(Exception):
+    """ No daemon is listening, or it serves a different api config. The operation was not run. """
+
+
+class DaemonError(Exception):
+    """ The operation ran in the daemon and failed. """
+
+    def __init__(self, message, error_type=None, status_code=None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.status_code = status_code
+
+
+def send(socket_path, key, op, params, timeout=None):
+    """
+    Runs op in the daemon listening on socket_path.
+    :param key: (str) FileTokenStore.key_for of the caller's api config, the daemon refuses other configs
+    :return: the operation's result
+    :raises DaemonUnavailable: if the operation should be run locally instead
+    :raises DaemonError: if the operation failed in the daemon
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        raise DaemonUnavailable(f"No daemon socket at {socket_path}")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path)
+        except OSError as exc:
+            raise DaemonUnavailable(f"Can't connect to {socket_path}: {exc}")
+        sock.sendall(json.dumps({"op": op, "key": key, "params": params}).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as fp:
+            line = fp.readline()
+    if not line:
+        # The request was sent, so it may have run: don't fall back to running it again locally.
+        raise DaemonError(f"Daemon closed the connection during {op}")
+    response = json.loads(line)
+    if response.get("mismatch"):
+        raise DaemonUnavailable("Daemon serves a different api config")
+    if not response["ok"]:
+        raise DaemonError(response["error"], response.get("type"), response.get("status"))
+    return response["result"]
+
+
+class MemdDaemon(object):
+    """
+    Serves operations.OPERATIONS over a Unix socket from one long-lived Client, so CLI invocations skip
+    building a client, authenticating and connecting.
+    Each line on a connection is a JSON request {"op", "key", "params"} answered with one JSON line
+    {"ok": true, "result"} or {"ok": false, "error", "type", "status"}.
+    :param key: (str) FileTokenStore.key_for of the client's api config, requests for other configs are refused
+    """
+
+    def __init__(self, client, key, socket_path=DEFAULT_SOCKET_PATH):
+        if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+            raise RuntimeError("memd-api serve needs Unix domain sockets")
+        self.logger = logging.getLogger(__name__)
+        self.client = client
+        self.key = key
+        self.socket_path = socket_path
+        self._remove_stale_socket()
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+        umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(socket_path, self._make_handler())
+        finally:
+            os.umask(umask)
+        self._server.daemon_threads = True
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        with sock:
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                os.unlink(self.socket_path)
+                return
+        raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+
+    def handle(self, request):
+        if request.get("key") != self.key:
+            return {"ok": False, "mismatch": True, "error": "api config mismatch"}
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "result": {"pid": os.getpid()}}
+        try:
+            return {"ok": True, "result": operations.run(self.client, op, request.get("params") or {})}
+        except Exception as exc:
+            response = getattr(exc, "response", None)
+            self.logger.warning("%s failed: %s", op, exc)
+            return {"ok": False, "error": str(exc), "type": type(exc).__name__,
+                    "status": getattr(response, "status_code", None)}
+
+    def _make_handler(self):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                    except ValueError:
+                        response = {"ok": False, "error": "Invalid JSON request"}
+                    else:
+                        response = daemon.handle(request)
+                    self.wfile.write(json.dumps(response, default=str).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+
+        return Handler
+
+    def serve_forever(self):
+        self.logger.info("Serving on %s", self.socket_path)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        """ Stops serve_forever, call from another thread or a signal handler. """
+        threading.Thread(target=self._server.shutdown, daemon=True).start()
@@ -0,0 +1,286 @@
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+DEFAULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "defaults.json")
+
+
+def make_member(index=0, plancode="TEST1", **fields):
+    """
+    A member payload valid against PRIMARY_MEMBER_SCHEMA, built on the packaged defaults.json, for
+    benchmarks and tests. fields override the generated values.
+    """
+    with open(DEFAULTS_PATH, "r") as fp:
+        member = json.load(fp)
+    member.update({
+        "externalID": str(uuid.uuid4()),
+        "name": {"First": f"Test{index}", "Last": "Member"},
+        "email": f"test{index}@localhost.com",
+        "plancode": plancode,
+        "benefitstart": "2026-01-01T00:00:00"
+    })
+    member.update(fields)
+    return member
+
+
+class FakeMemdServer(object):
+    """
+    In-process stand-in for the MEMD endpoints used by Client, for benchmarks and local runs.
+
+    Serves /v2/token, GET/POST/PUT /v1/partnermember, /v1/partnermember/{id}/policy/ and
+    /v1/member/{id}/policy/{plancode} from memory on a background thread.
+
+    :param latency: (float) Seconds added to every response
+    :param latency_jitter: (float) Up to this many extra seconds, uniformly distributed
+    :param error_rate: (float) Fraction of requests answered with 503 and Retry-After: 0
+    :param token_expires_in: (int) Lifetime of issued bearer tokens, expired tokens get a 401
+    :param seed: Seed for the latency and error randomness
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, latency_jitter=0.0, error_rate=0.0,
+                 token_expires_in=3600, seed=None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.token_expires_in = token_expires_in
+        self.members = {}
+        self.tokens = {}
+        self.requests = {}
+        self._next_policy_id = 1
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def dict_config(self, **settings):
+        """ A Client dict_config pointing at this server, settings are added as optional Client SETTINGS. """
+        config = {"base_url": self.base_url, "username": "fake", "password": "fake", "client_id": "fake",
+                  "client_secret": "fake"}
+        config.update(settings)
+        return config
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-memd", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def _delay(self):
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.latency_jitter) if self.latency_jitter else 0.0)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+    def issue_token(self):
+        token = uuid.uuid4().hex
+        with self._lock:
+            self.tokens[token] = time.monotonic() + self.token_expires_in
+        return {"access_token": token, "token_type": "bearer", "expires_in": self.token_expires_in}
+
+    def token_valid(self, authorization):
+        if not authorization or not authorization.startswith("Bearer "):
+            return False
+        with self._lock:
+            expires_at = self.tokens.get(authorization[len("Bearer "):])
+        return expires_at is not None and expires_at > time.monotonic()
+
+    @staticmethod
+    def _name(name):
+        name = name or {}
+        return {"first": name.get("First", name.get("first")), "middle": name.get("Middle", name.get("middle")),
+                "last": name.get("Last", name.get("last"))}
+
+    def create_member(self, payload):
+        with self._lock:
+            if payload.get("externalID") in self.members:
+                return 409, {"message": "Member already exists"}
+            member = {k: v for k, v in payload.items() if k not in ("plancode", "benefitstart", "benefitend")}
+            member["name"] = self._name(payload.get("name"))
+            member["id"] = len(self.members) + 1
+            member["policies"] = []
+            if payload.get("plancode"):
+                member["policies"].append(self._new_policy(member, payload.get("plancode"), payload.get("benefitstart"),
+                                                           payload.get("benefitend") or None))
+            self.members[member["externalID"]] = member
+            return 200, json.loads(json.dumps(member))
+
+    def _new_policy(self, member, plancode, benefitstart, benefitend):
+        policy_id = self._next_policy_id
+        self._next_policy_id += 1
+        return {"policyId": policy_id, "externalID": member["externalID"], "plancode": plancode,
+                "benefitstart": benefitstart, "benefitend": benefitend, "isactive": True}
+
+    def get_member(self, external_id):
+        with self._lock:
+            member = self.members.get(external_id)
+            return None if member is None else json.loads(json.dumps(member))
+
+    def update_member(self, external_id, payload):
+        with self._lock:
+            member = self.members.get(external_id)
+            if member is None:
+                return 404, {"message": "Member not found"}
+            for k, v in payload.items():
+                if k in ("policies", "dependents", "externalID", "id"):
+                    continue
+                member[k] = self._name(v) if k == "name" else v
+            return 200, json.loads(json.dumps(member))
+
+    def create_policy(self, external_id, payload):
+        with self._lock:
+            member = self.members.get(external_id)
+            if member is None:
+                return 404, {"message": "Member not found"}
+            policy = self._new_policy(member, payload.get("plancode"), payload.get("benefitstart"),
+                                      payload.get("benefitend"))
+            member["policies"].append(policy)
+            return 200, dict(policy)
+
+    def terminate_policy(self, external_id, plancode, payload):
+        with self._lock:
+            member = self.members.get(external_id)
+            if member is None:
+                return 404, {"message": "Member not found"}
+            terminated = []
+            for policy in member["policies"]:
+                if policy["plancode"] == plancode and policy["isactive"]:
+                    policy["isactive"] = False
+                    policy["benefitend"] = payload.get("termdate", datetime.datetime.today().isoformat())
+                    terminated.append(dict(policy))
+            if not terminated:
+                return 404, {"message": f"No active policy {plancode}"}
+            return 200, terminated
+
+
+MEMBER_RE = re.compile(r"^/v1/partnermember/([^/]+)$")
+CREATE_POLICY_RE = re.compile(r"^/v1/partnermember/([^/]+)/policy/?$")
+TERMINATE_POLICY_RE = re.compile(r"^/v1/member/([^/]+)/policy/([^/]+)$")
+
+
+def _make_handler(server):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, without this delayed ACKs add ~40ms per response.
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def _send(self, status, body=None, headers=None):
+            data = b"" if body is None else json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for header, value in (headers or {}).items():
+                self.send_header(header, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _json_body(self):
+            try:
+                return json.loads(self._read_body() or b"{}")
+            except ValueError:
+                return None
+
+        def _guard(self, endpoint):
+            """ Common latency, error injection and auth, returns False if the request was already answered. """
+            server._count(endpoint)
+            if server._delay():
+                self._read_body()
+                self._send(503, {"message": "Injected failure"}, {"Retry-After": "0"})
+                return False
+            if endpoint != "token" and not server.token_valid(self.headers.get("Authorization")):
+                self._read_body()
+                self._send(401, {"message": "Authorization has been denied for this request."})
+                return False
+            return True
+
+        def do_GET(self):
+            match = MEMBER_RE.match(self.path)
+            if not match:
+                return self._send(404, {"message": "Not found"})
+            if not self._guard("get_member"):
+                return
+            member = server.get_member(match.group(1))
+            if member is None:
+                return self._send(404, {"message": "Member not found"})
+            etag = '"%s"' % hashlib.md5(json.dumps(member, sort_keys=True).encode("utf-8")).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, None, {"ETag": etag})
+            self._send(200, member, {"ETag": etag})
+
+        def do_PUT(self):
+            match = MEMBER_RE.match(self.path)
+            if not match:
+                return self._send(404, {"message": "Not found"})
+            if not self._guard("update_member"):
+                return
+            payload = self._json_body()
+            if not isinstance(payload, dict):
+                return self._send(400, {"message": "Invalid JSON"})
+            self._send(*server.update_member(match.group(1), payload))
+
+        def do_POST(self):
+            if self.path == "/v2/token":
+                if not self._guard("token"):
+                    return
+                form = parse_qs(self._read_body().decode("utf-8"))
+                if form.get("grant_type") != ["password"]:
+                    return self._send(400, {"error": "unsupported_grant_type"})
+                return self._send(200, server.issue_token())
+            if self.path.rstrip("/") == "/v1/partnermember":
+                endpoint, handler = "create_member", lambda payload: server.create_member(payload)
+            elif CREATE_POLICY_RE.match(self.path):
+                external_id = CREATE_POLICY_RE.match(self.path).group(1)
+                endpoint, handler = "create_policy", lambda payload: server.create_policy(external_id, payload)
+            elif TERMINATE_POLICY_RE.match(self.path):
+                external_id, plancode = TERMINATE_POLICY_RE.match(self.path).groups()
+                endpoint, handler = "terminate_policy", lambda payload: server.terminate_policy(
+                    external_id, plancode, payload)
+            else:
+                self._read_body()
+                return self._send(404, {"message": "Not found"})
+            if not self._guard(endpoint):
+                return
+            payload = self._json_body()
+            if not isinstance(payload, dict):
+                return self._send(400, {"message": "Invalid JSON"})
+            self._send(*handler(payload))
+
+    return Handler
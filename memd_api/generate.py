@@ -0,0 +1,138 @@
+"""
+Synthetic members for load and staging tests, written as NDJSON payloads for PRIMARY_MEMBER_SCHEMA.
+
+Rows are formatted from pre-serialized JSON fragments instead of building and dumping a dict per member,
+which is what makes generating hundreds of thousands of rows per second possible.
+"""
+import datetime
+import json
+import random
+
+FIRST_NAMES = (
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth",
+    "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+    "Christopher", "Nancy", "Daniel", "Lisa", "Matthew", "Betty", "Anthony", "Margaret", "Mark", "Sandra",
+    "Donald", "Ashley", "Steven", "Kimberly", "Paul", "Emily", "Andrew", "Donna", "Joshua", "Michelle",
+    "Kenneth", "Dorothy", "Kevin", "Carol", "Brian", "Amanda", "George", "Melissa", "Edward", "Deborah",
+    "Ronald", "Stephanie", "Timothy", "Rebecca", "Jason", "Sharon", "Jeffrey", "Laura", "Ryan", "Cynthia",
+    "Jacob", "Kathleen", "Gary", "Amy"
+)
+LAST_NAMES = (
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+    "Walker", "Young", "Allen", "King", "Wright", "Scott", "Torres", "Nguyen", "Hill", "Flores",
+    "Green", "Adams", "Nelson", "Baker", "Hall", "Rivera", "Campbell", "Mitchell", "Carter", "Roberts",
+    "Gomez", "Phillips", "Evans", "Turner", "Diaz", "Parker", "Cruz", "Edwards", "Collins", "Reyes",
+    "Stewart", "Morris", "Morales", "Murphy"
+)
+# (city, state, zipCode)
+PLACES = (
+    ("Scottsdale", "AZ", "85281"), ("Phoenix", "AZ", "85004"), ("Tucson", "AZ", "85701"),
+    ("Denver", "CO", "80202"), ("Austin", "TX", "78701"), ("Dallas", "TX", "75201"),
+    ("Houston", "TX", "77002"), ("Albuquerque", "NM", "87102"), ("Las Vegas", "NV", "89101"),
+    ("Salt Lake City", "UT", "84101"), ("San Diego", "CA", "92101"), ("Sacramento", "CA", "95814"),
+    ("Portland", "OR", "97204"), ("Seattle", "WA", "98101"), ("Boise", "ID", "83702"),
+    ("Omaha", "NE", "68102")
+)
+STREETS = ("Main St", "Oak Ave", "Maple Dr", "Cedar Ln", "Pine St", "Elm St", "Washington Blvd", "Lake Rd")
+GENDERS = ("M", "F")
+# Fields each row sets itself, the rest comes from the base payload.
+GENERATED_FIELDS = ("externalID", "name", "email", "dob", "gender", "address")
+DOB_START = datetime.date(1940, 1, 1)
+DOB_DAYS = (datetime.date(2005, 12, 31) - DOB_START).days
+
+CHUNK_SIZE = 10000
+NODE_MASK = (1 << 48) - 1
+
+
+def _uuid4(bits, node):
+    """
+    A version 4 UUID string from 128 random bits with the low 48 bits (the node) replaced by node, which the
+    generator derives from the row index so ids are unique within a run whatever the random draw.
+    """
+    bits = (bits & ~NODE_MASK) | (node & NODE_MASK)
+    bits = (bits & ~(0xf000 << 64)) | (0x4000 << 64)
+    bits = (bits & ~(0xc000 << 48)) | (0x8000 << 48)
+    h = "%032x" % bits
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+class MemberGenerator(object):
+    """
+    Reproducible stream of distinct members: the same seed, base and count give the same rows.
+    Emails combine the name, a tag drawn from the seed and the row index, so they are unique within a run
+    and don't clash with runs that used another seed.
+    """
+
+    def __init__(self, seed=None, base=None, email_domain="localhost.com"):
+        """
+        :param seed: (int) Random seed, a random one is picked and kept in self.seed if None
+        :param base: (dict) Payload the generated fields are added to, e.g. the --defaults values with
+            plancode and benefitstart set
+        """
+        self.seed = random.SystemRandom().getrandbits(32) if seed is None else seed
+        self.base = {k: v for k, v in (base or {}).items() if k not in GENERATED_FIELDS}
+        self.email_domain = email_domain
+        tail = json.dumps(self.base, separators=(",", ":"))[1:-1]
+        self._tail = "," + tail if tail else ""
+        # JSON for the name and address of each choice, computed once.
+        self._names = [(json.dumps(first), json.dumps(last), f"{first[0].lower()}{last.lower()}")
+                       for first in FIRST_NAMES for last in LAST_NAMES]
+        self._addresses = [
+            json.dumps({"address1": f"{number} {street}", "address2": None, "city": city, "state": state,
+                        "zipCode": zip_code}, separators=(",", ":"))
+            for number in (12, 118, 404, 777, 1520, 2301, 3890, 9011)
+            for street in STREETS
+            for city, state, zip_code in PLACES
+        ]
+        self._dobs = [(DOB_START + datetime.timedelta(days=day)).isoformat() + "T00:00:00"
+                      for day in range(DOB_DAYS + 1)]
+
+    def iter_lines(self, count, start=0):
+        """
+        Yields count NDJSON lines, newline included, for rows start to start + count - 1. Rows are the same
+        as those at the same indexes of a run from 0, so a population can be generated in parts.
+        """
+        rng = random.Random(self.seed)
+        tag = "%06x" % rng.getrandbits(24)
+        # XOR with a per-seed mask keeps nodes distinct while not showing the index.
+        node_mask = rng.getrandbits(48)
+        getrandbits = rng.getrandbits
+        for _ in range(start):
+            getrandbits(128)
+            getrandbits(64)
+        names, addresses, dobs = self._names, self._addresses, self._dobs
+        n_names, n_addresses, n_dobs = len(names), len(addresses), len(dobs)
+        domain, tail = self.email_domain, self._tail
+        for index in range(start, start + count):
+            id_bits = getrandbits(128)
+            pick = getrandbits(64)
+            first, last, handle = names[pick % n_names]
+            pick //= n_names
+            address = addresses[pick % n_addresses]
+            pick //= n_addresses
+            dob = dobs[pick % n_dobs]
+            gender = GENDERS[(pick // n_dobs) & 1]
+            external_id = _uuid4(id_bits, index ^ node_mask)
+            yield (f'{{"externalID":"{external_id}","name":{{"First":{first},"Last":{last}}},'
+                   f'"email":"{handle}.{tag}{index}@{domain}","dob":"{dob}","gender":"{gender}",'
+                   f'"address":{address}{tail}}}\n')
+
+    def write(self, fp, count, start=0, chunk_size=CHUNK_SIZE):
+        """
+        Writes count rows to fp in chunks of chunk_size lines.
+        :return: (int) rows written
+        """
+        written = 0
+        chunk = []
+        for line in self.iter_lines(count, start=start):
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                fp.write("".join(chunk))
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            fp.write("".join(chunk))
+            written += len(chunk)
+        return written
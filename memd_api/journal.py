@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+
+STARTED = 1
+DONE = 2
+FAILED = 3
+
+_CODES = {"S": STARTED, "D": DONE, "F": FAILED}
+
+
+class Journal(object):
+    """
+    Append-only record of batch operations, one short line per event: "S <index>" when an operation
+    starts, "D <index>" when it completes and "F <index>" when it fails.
+
+    Lines are flushed as they are written, so a killed process loses nothing, and fsynced at most every
+    fsync_interval seconds. states() replays the file into one byte per operation.
+    """
+
+    def __init__(self, path, fsync_interval=1.0):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._fp = None
+        self._synced_at = time.monotonic()
+
+    def states(self):
+        """
+        :return: (bytearray) state of each operation index: 0 never started, STARTED, DONE or FAILED
+        """
+        states = bytearray()
+        if not os.path.exists(self.path):
+            return states
+        with open(self.path, "r") as fp:
+            for line in fp:
+                parts = line.split(" ", 1)
+                # A torn last line from a crash has no newline or a partial index, ignore it.
+                if len(parts) != 2 or parts[0] not in _CODES or not line.endswith("\n"):
+                    continue
+                try:
+                    index = int(parts[1])
+                except ValueError:
+                    continue
+                if index >= len(states):
+                    states.extend(bytes(index + 1 - len(states)))
+                # DONE is final, a later S line can only come from a resumed retry that was in flight.
+                if states[index] != DONE:
+                    states[index] = _CODES[parts[0]]
+        return states
+
+    def open(self):
+        if os.path.exists(self.path):
+            self._repair_tail()
+        self._fp = open(self.path, "a")
+        return self
+
+    def _repair_tail(self):
+        """ Terminates a torn last line so the next record starts on its own line. """
+        with open(self.path, "rb+") as fp:
+            fp.seek(0, os.SEEK_END)
+            if fp.tell() == 0:
+                return
+            fp.seek(-1, os.SEEK_END)
+            if fp.read(1) != b"\n":
+                fp.write(b"\n")
+
+    def _write(self, code, index):
+        with self._lock:
+            self._fp.write(f"{code} {index}\n")
+            self._fp.flush()
+            now = time.monotonic()
+            if now - self._synced_at >= self.fsync_interval:
+                os.fsync(self._fp.fileno())
+                self._synced_at = now
+
+    def start(self, index):
+        self._write("S", index)
+
+    def done(self, index):
+        self._write("D", index)
+
+    def failed(self, index):
+        self._write("F", index)
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.flush()
+                os.fsync(self._fp.fileno())
+                self._fp.close()
+                self._fp = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
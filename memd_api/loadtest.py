@@ -0,0 +1,273 @@
+"""
+Load test driver: runs a weighted mix of member operations against a MEMD base_url and reports throughput,
+errors and latency percentiles per interval and overall.
+
+Two load models:
+- closed: a fixed number of workers each start their next operation when the previous one finishes, so the
+  offered rate drops when the server slows down.
+- open: operations are started on a fixed schedule at the target rate whatever the server does. Latency is
+  measured from the scheduled start, so time spent waiting for a free worker counts (no coordinated omission).
+"""
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import HdrHistogram
+
+logger = logging.getLogger(__name__)
+
+# name -> what it exercises, update and policy include the GET of the member like the CLI commands.
+OPERATIONS = {
+    "get": "get_primary_member",
+    "create": "create_primary_member",
+    "update": "get_primary_member + PrimaryMember.update",
+    "policy": "get_primary_member + PrimaryMember.create_policy"
+}
+PHONES = ("602-555-0100", "602-555-0101", "480-555-0102", "480-555-0103")
+
+
+def parse_mix(text):
+    """
+    Parses "get=70,create=10,..." into {operation: weight}.
+    :raises ValueError: for unknown operations, bad weights or no positive weight
+    """
+    mix = {}
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name}, expected one of {', '.join(OPERATIONS)}")
+        try:
+            mix[name] = float(weight) if sep else 1.0
+        except ValueError:
+            raise ValueError(f"Bad weight for {name}: {weight}")
+        if mix[name] < 0:
+            raise ValueError(f"Negative weight for {name}")
+    if not any(mix.values()):
+        raise ValueError("The operation mix needs at least one positive weight")
+    return mix
+
+
+def error_name(exc):
+    """ The HTTP status for failed requests, otherwise the exception class name. """
+    response = getattr(exc, "response", None)
+    if response is not None:
+        return str(response.status_code)
+    return type(exc).__name__
+
+
+class OperationStats(object):
+    __slots__ = ("latency", "errors")
+
+    def __init__(self):
+        self.latency = HdrHistogram()
+        self.errors = {}
+
+    def as_dict(self, elapsed):
+        count = self.latency.count
+        failed = sum(self.errors.values())
+        return {
+            "operations": count,
+            "errors": dict(self.errors),
+            "error_rate": failed / count if count else 0.0,
+            "throughput": count / elapsed if elapsed > 0 else 0.0,
+            "latency_seconds": self.latency.percentiles()
+        }
+
+
+class LoadStats(object):
+    """ Per operation latency histograms and error counts, for one interval or a whole run. """
+
+    def __init__(self):
+        self.operations = {}
+
+    def record(self, op, latency, error=None):
+        stats = self.operations.get(op)
+        if stats is None:
+            stats = self.operations[op] = OperationStats()
+        stats.latency.observe(latency)
+        if error is not None:
+            stats.errors[error] = stats.errors.get(error, 0) + 1
+
+    def merge(self, other):
+        for op, other_stats in other.operations.items():
+            stats = self.operations.get(op)
+            if stats is None:
+                stats = self.operations[op] = OperationStats()
+            stats.latency.merge(other_stats.latency)
+            for error, count in other_stats.errors.items():
+                stats.errors[error] = stats.errors.get(error, 0) + count
+
+    def as_dict(self, elapsed):
+        total = OperationStats()
+        for stats in self.operations.values():
+            total.latency.merge(stats.latency)
+            for error, count in stats.errors.items():
+                total.errors[error] = total.errors.get(error, 0) + count
+        result = total.as_dict(elapsed)
+        result["by_operation"] = {op: stats.as_dict(elapsed) for op, stats in sorted(self.operations.items())}
+        return result
+
+
+class LoadTest(object):
+    """
+    :param client: (Client) Shared by every worker, size its pool for the concurrency
+    :param mix: (dict) {operation: weight} see parse_mix
+    :param generator: (MemberGenerator) Payloads for create and for the members created up front
+    :param plan_code: Plancode of the policy operation
+    :param seed: Seed for the choice of operations and members
+    """
+
+    def __init__(self, client, mix, generator, plan_code="DWA57Q83", seed=None):
+        self.client = client
+        self.plan_code = plan_code
+        self._ops = list(mix)
+        self._weights = [mix[op] for op in self._ops]
+        self._random = random.Random(seed)
+        self._rows = generator.iter_lines(1 << 62)
+        self._lock = threading.Lock()
+        self.external_ids = []
+        self._interval = LoadStats()
+        self._interval_started = None
+        self.total = LoadStats()
+
+    def _next_member(self):
+        with self._lock:
+            return json.loads(next(self._rows))
+
+    def _pick(self):
+        """ :return: (op, external_id) with external_id None when there is no member to work on yet """
+        with self._lock:
+            op = self._random.choices(self._ops, self._weights)[0]
+            external_id = self._random.choice(self.external_ids) if self.external_ids else None
+            return op, external_id
+
+    def prepopulate(self, count, workers=8):
+        """ Creates count members for get, update and policy to work on. """
+        from .bulk import bounded_map
+        members = (self._next_member() for _ in range(count))
+        failed = 0
+        for _, member, exc, _ in bounded_map(lambda m: self.client.create_primary_member(m, validate=False),
+                                             members, workers=workers):
+            if exc is not None:
+                failed += 1
+                logger.warning("Unable to create a member for the load test: %s", exc)
+            else:
+                self.external_ids.append(member._id)
+        return failed
+
+    def run_operation(self, op, external_id):
+        # Without members to work on yet, everything is a create.
+        if op == "create" or external_id is None:
+            member = self.client.create_primary_member(self._next_member(), validate=False)
+            with self._lock:
+                self.external_ids.append(member._id)
+        elif op == "get":
+            self.client.get_primary_member(external_id)
+        elif op == "update":
+            self.client.get_primary_member(external_id).update(phone=random.choice(PHONES))
+        elif op == "policy":
+            self.client.get_primary_member(external_id).create_policy(self.plan_code)
+
+    def _timed(self, scheduled=None):
+        """ Runs one operation and records its latency from scheduled, or from now for the closed model. """
+        op, external_id = self._pick()
+        started = time.monotonic() if scheduled is None else scheduled
+        error = None
+        try:
+            self.run_operation(op, external_id)
+        except Exception as exc:
+            error = error_name(exc)
+            logger.debug("%s failed: %s", op, exc)
+        latency = time.monotonic() - started
+        with self._lock:
+            self._interval.record(op, latency, error)
+
+    def _report_loop(self, stop, interval, on_interval, started):
+        while not stop.wait(max(0.0, self._interval_started + interval - time.monotonic())):
+            self._close_interval(on_interval, started)
+
+    def _close_interval(self, on_interval, started):
+        now = time.monotonic()
+        with self._lock:
+            stats, self._interval = self._interval, LoadStats()
+        self.total.merge(stats)
+        if on_interval is not None and stats.operations:
+            report = stats.as_dict(now - self._interval_started)
+            report["elapsed"] = now - started
+            on_interval(report)
+        self._interval_started = now
+
+    def _run(self, drive, duration, interval, on_interval):
+        stop = threading.Event()
+        started = self._interval_started = time.monotonic()
+        reporter = threading.Thread(target=self._report_loop, args=(stop, interval, on_interval, started),
+                                    name="memd-loadtest-report", daemon=True)
+        reporter.start()
+        try:
+            extra = drive(started + duration)
+        finally:
+            stop.set()
+            reporter.join()
+        self._close_interval(on_interval, started)
+        elapsed = time.monotonic() - started
+        result = self.total.as_dict(elapsed)
+        result["elapsed"] = elapsed
+        result.update(extra)
+        return result
+
+    def run_closed(self, concurrency, duration, interval=5.0, on_interval=None):
+        """
+        Closed model: concurrency workers run operations back to back for duration seconds.
+        :param on_interval: Optional callable(report) called every interval seconds
+        :return: (dict) the report of the whole run
+        """
+        def worker(deadline):
+            while time.monotonic() < deadline:
+                self._timed()
+
+        def drive(deadline):
+            threads = [threading.Thread(target=worker, args=(deadline,), name=f"memd-loadtest-{i}", daemon=True)
+                       for i in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return {"model": "closed", "concurrency": concurrency}
+
+        return self._run(drive, duration, interval, on_interval)
+
+    def run_open(self, rate, duration, max_in_flight=64, interval=5.0, on_interval=None):
+        """
+        Open model: starts rate operations per second for duration seconds on up to max_in_flight workers.
+        Operations still waiting for a worker when the duration ends are not run and counted as "missed".
+        :param on_interval: Optional callable(report) called every interval seconds
+        :return: (dict) the report of the whole run
+        """
+        def drive(deadline):
+            scheduled = 0
+            futures = []
+            with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="memd-loadtest") as executor:
+                start = time.monotonic()
+                while True:
+                    at = start + scheduled / rate
+                    if at >= deadline:
+                        break
+                    delay = at - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    futures.append(executor.submit(self._timed, at))
+                    scheduled += 1
+                    if len(futures) >= 1000:
+                        futures = [f for f in futures if not f.done()]
+                missed = sum(1 for f in futures if f.cancel())
+            return {"model": "open", "target_rate": rate, "max_in_flight": max_in_flight, "scheduled": scheduled,
+                    "missed": missed}
+
+        return self._run(drive, duration, interval, on_interval)
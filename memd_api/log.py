@@ -0,0 +1,137 @@
+"""
+Logging setup for the CLI and long bulk runs.
+
+Records are handed to a QueueHandler and written by a QueueListener thread, so a slow terminal or disk never
+stalls a worker. Per-request debug events are logged with extra={"sampled": True} and can be thinned out
+with SamplingFilter. Extra fields given to a log call (endpoint, status, latency, ...) are kept on the record
+and written as keys by JsonFormatter.
+Worker processes have no listener thread of their own, their records are sent back over a multiprocessing
+queue (see forward_worker_logs and log_to_queue) and written by the parent.
+"""
+import itertools
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+
+LOG_FORMAT_STR = '[%(asctime)s][%(name)s:%(levelname)s] %(message)s'
+# Attributes every LogRecord has, anything else on a record came from extra.
+_RECORD_ATTRIBUTES = frozenset(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime"}
+
+
+class LazyJson(object):
+    """ Log argument that is only serialized if the record is actually emitted. """
+    __slots__ = ("obj", "indent")
+
+    def __init__(self, obj, indent=4):
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self):
+        return json.dumps(self.obj, indent=self.indent, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through 1 in every `every` DEBUG records marked sampled (extra={"sampled": True}), everything else
+    passes. Counting instead of drawing random numbers keeps the cost to one increment per record.
+    """
+
+    def __init__(self, every=1):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if self.every == 1 or record.levelno > logging.DEBUG or not getattr(record, "sampled", False):
+            return True
+        return next(self._counter) % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per record: time, level, logger, message, the extra fields and any traceback. """
+
+    def format(self, record):
+        event = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key != "sampled":
+                event[key] = value
+        if record.exc_info:
+            event["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str)
+
+
+def configure_logging(level=logging.WARNING, fmt="text", sample_every=1, stream=None):
+    """
+    Routes the root logger through a queue to a stream handler, replacing what an earlier call installed,
+    so calling it again (e.g. several CLI invocations in one process) doesn't duplicate output.
+    :param level: Root logger level, records below it are dropped before any formatting
+    :param fmt: "text" or "json"
+    :param sample_every: (int) Keep 1 in sample_every sampled debug records
+    :param stream: Defaults to stderr
+    :return: (QueueListener) started, see stop_logging
+    """
+    stop_logging()
+    root = logging.getLogger()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(LOG_FORMAT_STR))
+    records = queue.SimpleQueue()
+    # QueueHandler.prepare merges args and any traceback into the message, extra fields stay on the record.
+    handler = logging.handlers.QueueHandler(records)
+    handler.addFilter(SamplingFilter(sample_every))
+    handler.listener = logging.handlers.QueueListener(records, target, respect_handler_level=True)
+    handler._memd_api = True
+    root.addHandler(handler)
+    root.setLevel(level)
+    handler.listener.start()
+    return handler.listener
+
+
+def stop_logging():
+    """ Removes the handler installed by configure_logging, writing out the records still queued. """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if getattr(handler, "_memd_api", False):
+            root.removeHandler(handler)
+            handler.listener.stop()
+
+
+class _ForwardHandler(logging.Handler):
+    """ Passes records from worker processes to the logger of the same name in this process. """
+
+    def emit(self, record):
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+
+def forward_worker_logs():
+    """
+    Parent side of worker process logging: records put on the returned queue by log_to_queue are handled
+    by this process's loggers, so they go through configure_logging's handler like the parent's own.
+    :return: (queue, listener) pass queue to the workers and call listener.stop() once they have exited
+    """
+    records = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(records, _ForwardHandler())
+    listener.start()
+    return records, listener
+
+
+def log_to_queue(records, level):
+    """
+    Worker side of forward_worker_logs: replaces the root handlers, whose listener thread isn't running in a
+    forked process, with one that sends records to the parent.
+    :param records: The queue returned by forward_worker_logs
+    :param level: Root logger level, the parent's so records it would drop aren't sent
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
@@ -1,48 +1,117 @@
 from requests.exceptions import RequestException
+import concurrent.futures
 import logging
 import datetime
-import json
+
+from .log import LazyJson
+
+logger = logging.getLogger(__name__)
+
+
+class Field(object):
+    """
+    Attribute read lazily from the raw response in _data. Assigned values are kept apart from _data
+    and mark the field dirty, parsed values (e.g. MemberName) are cached on first access.
+    """
+    __slots__ = ("key", "bit", "parse", "default")
+    MISSING = object()
+
+    def __init__(self, key, bit, parse=None, default=MISSING):
+        self.key = key
+        self.bit = bit
+        self.parse = parse
+        self.default = default
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        if obj._values is not None and self.key in obj._values:
+            return obj._values[self.key]
+        if self.key not in obj._data:
+            if self.default is Field.MISSING:
+                raise AttributeError(self.key)
+            return self.default
+        value = obj._data[self.key]
+        if self.parse is not None and value is not None:
+            value = self.parse(value)
+            obj._cache(self.key, value)
+        return value
+
+    def __set__(self, obj, value):
+        obj._cache(self.key, value)
+        obj._dirty |= self.bit
 
 
 class Base(object):
-    _data = {}
-    _fields_changed = []
+    """
+    Slotted model over a raw MEMD response. Fields listed in FIELDS are parsed from _data on access,
+    nothing is copied at load time. Assigned fields are tracked in the _dirty bitset.
+    """
+    __slots__ = ("_client", "_data", "_values", "_dirty")
+    FIELDS = ()
+    PARSERS = {}
+    FIELD_DEFAULT = Field.MISSING
+    logger = logger
 
-    def __init__(self, *args, **kwargs):
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG)
-        self._fields_changed = []
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for i, key in enumerate(cls.FIELDS):
+            if not isinstance(cls.__dict__.get(key), Field):
+                setattr(cls, key, Field(key, 1 << i, cls.PARSERS.get(key), cls.FIELD_DEFAULT))
 
-    def as_dict(self):
-        return self._data
+    def __init__(self, client, data):
+        self._client = client
+        self._set_data(data)
+
+    def _set_data(self, data):
+        """ Replaces local state with data, discarding unsaved attribute changes. """
+        self._data = data
+        self._values = None
+        self._dirty = 0
+
+    def _cache(self, key, value):
+        if self._values is None:
+            self._values = {}
+        self._values[key] = value
+
+    @property
+    def _id(self):
+        return self._data.get("externalID")
 
-    def __setattr__(self, key, value):
-        self._fields_changed.append(key)
-        super(Base, self).__setattr__(key, value)
+    @property
+    def _fields_changed(self):
+        return {key for i, key in enumerate(self.FIELDS) if self._dirty >> i & 1}
+
+    def changes(self):
+        """ Assigned fields and their new values. """
+        changed = {}
+        for f in sorted(self._fields_changed):
+            changed[f] = getattr(self, f)
+        return {k: v.to_dict() if hasattr(v, "to_dict") else v for k, v in changed.items()}
+
+    def as_dict(self):
+        """ The raw response with any unsaved changes merged in, built on each call. """
+        data = dict(self._data)
+        data.update(self.changes())
+        return data
 
 
 class Policy(Base):
+    __slots__ = ()
+    FIELDS = ("externalID", "policyId", "benefitstart", "benefitend", "plancode", "isactive")
+    FIELD_DEFAULT = None
+
     def __init__(self, client, externalID=None, policyId=None, benefitstart=None,
                  benefitend=None, plancode=None, data=None):
-        self.externalID = externalID
-        self._id = externalID
-        self.policyId = policyId
-        self.benefitstart=benefitstart
-        self.benefitend=benefitend
-        self.plancode=plancode
-        self._client = client
         if data is None:
-            self._data = {
-                "externalid": self._id,
-                "policyId": self.policyId,
+            data = {
+                "externalID": externalID,
+                "policyId": policyId,
                 "benefitstart": benefitstart,
                 "benefitend": benefitend,
                 "plancode": plancode
             }
-        else:
-            self._data = data
-
-        super().__init__()
+        super().__init__(client, data)
 
     def terminate(self):
         url = f"{self._client.base_url}/v1/member/{self._id}/policy/{self.plancode}"
@@ -50,18 +119,18 @@ class Policy(Base):
             "termdate": datetime.datetime.today().replace(hour=0).replace(minute=0).replace(second=0).replace(
                 microsecond=0).isoformat()
         }
-        self.logger.debug(f"Terminating policy for {self._id} {self.plancode}: {payload}")
+        self.logger.debug("Terminating policy for %s %s: %s", self._id, self.plancode, payload)
         try:
             response_json = self._client._post_json(url, payload, raise_for_status=True)
+            data = dict(self._data)
             for elem in response_json:
-                for k, v in elem.items():
-                    if hasattr(self, k):
-                        setattr(self, k, v)
-            self._data = response_json
-            self._fields_changed = []
+                data.update(elem)
+            self._set_data(data)
             return response_json
         except RequestException as exc:
             self.logger.exception("Error Terminating Policy", exc_info=True)
+        finally:
+            self._client.invalidate_member(self._id)
 
     def save(self, dry_run=False):
         url = f"{self._client.base_url}/v1/partnermember/{self._id}/policy/"
@@ -72,94 +141,121 @@ class Policy(Base):
         }
         if dry_run:
             return payload
-        self.logger.debug(f"Updating policy for {self._id}: {payload}")
+        self.logger.debug("Updating policy for %s: %s", self._id, payload)
         try:
             response_json = self._client._post_json(url, payload, raise_for_status=True)
-            for k, v in response_json.items():
-                if hasattr(self, k):
-                    setattr(self, k, v)
-            self._data = response_json
-            self._fields_changed = []
+            self._set_data(response_json)
             return response_json
         except RequestException as exc:
             self.logger.exception("Error Updating Policy", exc_info=True)
+        finally:
+            self._client.invalidate_member(self._id)
 
 
 class MemberName(object):
+    __slots__ = ("first", "middle", "last")
+
     def __init__(self, first=None, middle=None, last=None):
         self.first = first
         self.middle = middle
         self.last = last
 
+    @classmethod
+    def from_dict(cls, name):
+        return cls(name.get("first"), name.get("middle"), name.get("last"))
+
     def to_dict(self):
         return {"first": self.first, "middle": self.middle, "last": self.last}
 
 
 class PrimaryMember(Base):
+    __slots__ = ()
     UPDATE_FIELDS = ("name.First", "name.Middle", "name.Last", "email", "phone", "dob", "gender", "address", "city", "state", "zipCode", "misc3")
     FIELDS_CHANGEABLE = ("name", "email", "phone", "dob", "gender", "address", "misc3")
+    FIELDS = ("externalsubscriberid", "relationship", "misc1", "misc2", "misc3", "mrn", "rxDiscounts", "id",
+              "externalID", "email", "phone", "dob", "gender", "address", "city", "state", "zipCode", "termsAgreed",
+              "subscriber", "preferredLanguage", "fromImport", "plancode", "name", "policies")
+    PARSERS = {"name": MemberName.from_dict}
+    MAX_DEACTIVATE_ATTEMPTS = 10
 
     def __init__(self, client, **member_data):
         """
         :param member_dict: Member Info (via /v1/partnermember)
         """
-        self._client = client
-        self.load(**member_data)
-        super().__init__()
+        if "externalID" not in member_data:
+            raise ValueError("externalID is required")
+        super().__init__(client, member_data)
+
+    @property
+    def dependants(self):
+        return []
 
     def load(self, **member_data):
+        """ Replaces local state with member_data from MEMD, discarding unsaved attribute changes. """
         if "externalID" not in member_data:
             raise ValueError("externalID is required")
-        self._id = member_data["externalID"]
-        self.dependants = []
-        self.policies = member_data.get("policies")
-        if "name" in member_data:
-            self.name = MemberName(**member_data["name"])
-        for k in ("externalsubscriberid", "relationship", "misc1", "misc2", "misc3", "mrn", "rxDiscounts", "id",
-                  "externalID", "email", "phone", "dob", "gender", "address", "termsAgreed", "subscriber",
-                  "preferredLanguage", "fromImport", "plancode"):
-            if k in member_data:
-                setattr(self, k, member_data[k])
-        self._data = member_data
+        self._set_data(member_data)
 
     def terminate_policy(self, plancode, benefitend=None, dry_run=False):
         if benefitend is None:
             benefitend = datetime.datetime.today()
         benefitend = benefitend.replace(hour=0).replace(minute=0).replace(second=0).replace(
                 microsecond=0).isoformat()
-        self.logger.info(f"Terminating policy for {self._id} plancode {plancode} dry_run={dry_run}")
+        self.logger.info("Terminating policy for %s plancode %s dry_run=%s", self._id, plancode, dry_run)
         payload = {
             "termdate": datetime.datetime.today().replace(hour=0).replace(minute=0).replace(second=0).replace(
                 microsecond=0).isoformat()
         }
         if not dry_run:
-            self.logger.debug(f"Terminating policy for {self._id} policy {plancode}")
+            self.logger.debug("Terminating policy for %s policy %s", self._id, plancode)
             url = f"{self._client.base_url}/v1/member/{self._id}/policy/{plancode}"
             try:
                 return self._client._post_json(url, payload, raise_for_status=True)
             except RequestException as exc:
-                if hasattr(exc, 'response'):
+                if getattr(exc, 'response', None) is not None:
                     if str(exc.response.status_code) == '404':
-                        self.logger.warning(f"For member {self._id}, Tried to delete plancode {plancode} but it was not found")
+                        self.logger.warning("For member %s, Tried to delete plancode %s but it was not found",
+                                            self._id, plancode)
+            finally:
+                self._client.invalidate_member(self._id)
         else:
             return payload
 
     def active_policies(self):
         return [p for p in self.policies if p["isactive"]]
 
-    def deactivate_policies(self, dry_run=False, deactivated=[], _count=0):
-        _count += 1
-        if _count > 10:
-            raise Exception(f"Too many attempts to deactivate policies for {self._id} ({_count})")
+    def _terminate_policies(self, plancodes, workers):
+        if workers <= 1 or len(plancodes) <= 1:
+            return [(plancode, self.terminate_policy(plancode)) for plancode in plancodes]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(plancodes))) as executor:
+            return list(zip(plancodes, executor.map(self.terminate_policy, plancodes)))
+
+    def deactivate_policies(self, dry_run=False, deactivated=None, workers=4):
+        """
+        Terminates every active policy.
+        All active policies are terminated in one pass (concurrently when workers > 1), then state is
+        refreshed with a single reload. Another pass is only made for policies still active after the reload,
+        up to MAX_DEACTIVATE_ATTEMPTS passes.
+        :return: list of {"plancode": plancode, plancode: termination response}
+        """
+        if deactivated is None:
+            deactivated = []
         if dry_run:
-            active_policies = self.active_policies()
-            for p in active_policies:
+            for p in self.active_policies():
                 deactivated.append({"plancode": p["plancode"], p["plancode"]: self.terminate_policy(p["plancode"], dry_run=True)})
-        else:
+            return deactivated
+        for attempt in range(1, self.MAX_DEACTIVATE_ATTEMPTS + 1):
+            plancodes = []
             for p in self.active_policies():
-                deactivated.append({"plancode": p["plancode"], p["plancode"]: self.terminate_policy(p["plancode"], dry_run=dry_run)})
-                self.reload()
-                return self.deactivate_policies(dry_run=dry_run, deactivated=deactivated, _count=_count)
+                if p["plancode"] not in plancodes:
+                    plancodes.append(p["plancode"])
+            if not plancodes:
+                return deactivated
+            for plancode, response in self._terminate_policies(plancodes, workers):
+                deactivated.append({"plancode": plancode, plancode: response})
+            self.reload()
+        if self.active_policies():
+            raise Exception(f"Too many attempts to deactivate policies for {self._id} ({self.MAX_DEACTIVATE_ATTEMPTS})")
         return deactivated
 
     def create_policy(self, plancode, benefitstart=None, dry_run=False):
@@ -181,14 +277,14 @@ class PrimaryMember(Base):
             result = {"terminated": self.active_policies()}
         else:
             result = {"terminated": self.deactivate_policies(dry_run=dry_run)}
-        self.logger.info(f"Termintated policies: {result}")
-        self.logger.info(f"Creating new policy for {self._id} plancode {plancode} dry_run={dry_run}")
+        self.logger.info("Termintated policies: %s", result)
+        self.logger.info("Creating new policy for %s plancode %s dry_run=%s", self._id, plancode, dry_run)
         if not dry_run:
             url = f"{self._client.base_url}/v1/partnermember/{self._id}/policy/"
             try:
                 result["created"] = self._client._post_json(url, new_policy_payload, raise_for_status=True)
             except RequestException as exc:
-                self.logger.warning(f"Unable to create policy for {self._id}, plancode {plancode} not found")
+                self.logger.warning("Unable to create policy for %s, plancode %s not found", self._id, plancode)
                 self.logger.warning("Reverting to previous policies")
                 url = f"{self._client.base_url}/v1/partnermember/{self._id}/policy/"
                 for policy in result["terminated"]:
@@ -200,10 +296,12 @@ class PrimaryMember(Base):
                     try:
                         self._client._post_json(url, payload, raise_for_status=True)
                     except RequestException as exc:
-                        self.logger.warning(f"Error trying to revert policies for {self._id} plancode {policy['plancode']} {exc}")
+                        self.logger.warning("Error trying to revert policies for %s plancode %s %s", self._id,
+                                            policy["plancode"], exc)
                         continue
                 raise
             finally:
+                self._client.invalidate_member(self._id)
                 self.reload()
         else:
             result["created"] = new_policy_payload
@@ -211,8 +309,7 @@ class PrimaryMember(Base):
 
     def reload(self):
         self.logger.debug("Reloading state")
-        url = f"{self._client.base_url}/v1/partnermember/{self._id}"
-        member_info = self._client._get_json(url, raise_for_status=True)
+        member_info = self._client._get_member_json(self._id, raise_for_status=True)
         self.load(**member_info)
         self.logger.debug("State reloaded")
 
@@ -221,50 +318,105 @@ class PrimaryMember(Base):
         result = {"terminated": [], "created": []}
         for p in self.active_policies():
             if p["plancode"] == plancode:
-                self.logger.debug(f"Plancode {plancode} is active")
+                self.logger.debug("Plancode %s is active", plancode)
                 break
         else:
             result = self.create_policy(plancode, benefitstart=benefitstart, dry_run=dry_run)
         return result
 
-    def update(self, dry_run=False, **kwargs):
-        self.reload()
-        update_dict = {k: v for k, v in self._data.items() if k not in ("dependents", "policies")}
-        for k, v in kwargs.items():
+    def changes(self):
+        """
+        Changed fields and their new values: every tracked attribute assignment plus in-place edits of name.
+        """
+        changed = super().changes()
+        name = self._values.get("name") if self._values is not None else None
+        if "name" not in changed and isinstance(name, MemberName):
+            # Compared in parsed form, the response's name may lack keys (e.g. middle) that to_dict() always has.
+            loaded = self._data.get("name")
+            if not isinstance(loaded, dict) or name.to_dict() != MemberName.from_dict(loaded).to_dict():
+                changed["name"] = name.to_dict()
+        return changed
+
+    def _update_payload(self, **kwargs):
+        """
+        :return: (payload, changed) the current snapshot with changed fields and kwargs merged in,
+            and just the fields that changed
+        """
+        changed = {}
+        for k, v in list(self.changes().items()) + list(kwargs.items()):
             if k not in self.FIELDS_CHANGEABLE:
-                self.logger.warning(f"Ignoring update for field {k}")
+                self.logger.warning("Ignoring update for field %s", k)
             else:
-                update_dict[k] = v
+                changed[k] = v
+        payload = {k: v for k, v in self._data.items() if k not in ("dependents", "policies")}
+        payload.update(changed)
+        return payload, changed
+
+    def _apply_put_response(self, payload, put_response_data):
+        """ Takes the new state from the PUT response instead of fetching the member again. """
+        if isinstance(put_response_data, dict) and put_response_data.get("externalID") == self._id:
+            member_data = dict(put_response_data)
+        else:
+            member_data = dict(self._data)
+            member_data.update(payload)
+        if "policies" not in member_data and "policies" in self._data:
+            member_data["policies"] = self._data["policies"]
+        self.load(**member_data)
+        self._client._record_member(member_data)
+
+    def _verify(self, changed):
+        """ Reloads from MEMD and warns about changed fields the server didn't take. """
+        self.reload()
+        for k, v in changed.items():
+            if self._data.get(k) != v:
+                self.logger.warning("Member %s field %s is %r after update, sent %r", self._id, k, self._data.get(k), v)
+
+    def update(self, dry_run=False, strict=False, **kwargs):
+        """
+        Sends one PUT with the current snapshot and the changed fields (tracked attribute changes and kwargs)
+        merged in, then takes the new state from the PUT response.
+        :param strict: (bool) Reload before building the payload and verify the result against MEMD afterwards
+        :return: The PUT response, or the payload if dry_run is set or nothing changed
+        """
+        if strict:
+            # changes() includes in-place edits like member.name.first, which reload() would discard.
+            pending = self.changes()
+            self.reload()
+            kwargs = dict(pending, **kwargs)
+        payload, changed = self._update_payload(**kwargs)
         if dry_run:
-            return update_dict
+            return payload
+        if not changed:
+            self.logger.debug("No changes to update for %s", self._id)
+            return payload
         url = f"{self._client.base_url}/v1/partnermember/{self._id}"
-        self.logger.debug(f"Updating {self._id} with payload:\n{json.dumps(update_dict, indent=4)}")
+        self.logger.debug("Updating %s with payload:\n%s", self._id, LazyJson(payload))
         try:
-            put_response_data = self._client._put_json(url, update_dict, raise_for_status=True)
-            self.reload()
-            return put_response_data
+            put_response_data = self._client._put_json(url, payload, raise_for_status=True)
         except RequestException as exc:
             self.logger.exception("Error Updating Member", exc_info=True)
             raise
+        finally:
+            self._client.invalidate_member(self._id)
+        if strict:
+            self._verify(changed)
+        else:
+            self._apply_put_response(payload, put_response_data)
+        return put_response_data
 
     def save(self, dry_run=False):
-        update_dict = {}
-        for f in self._fields_changed:
-            if f in self.FIELDS_CHANGEABLE:
-                val = getattr(self, f)
-                if hasattr(val, "to_dict"):
-                    update_dict[f] = val.to_dict()
-                else:
-                    update_dict[f] = val
-            else:
-                self.logger.warning(f"Ignoring update for field {f}")
+        """ Saves tracked attribute changes with one PUT, see update. """
+        payload, changed = self._update_payload()
         if dry_run:
-            return update_dict
+            return payload
+        if not changed:
+            return None
         url = f"{self._client.base_url}/v1/partnermember/{self._id}"
         try:
-            member_data = self._client._put_json(url, update_dict, raise_for_status=True)
-            self._fields_changed = []
+            member_data = self._client._put_json(url, payload, raise_for_status=True)
+            self._apply_put_response(payload, member_data)
             return member_data
         except RequestException as exc:
             self.logger.exception("Error Updating Member", exc_info=True)
-
+        finally:
+            self._client.invalidate_member(self._id)
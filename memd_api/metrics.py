@@ -0,0 +1,260 @@
+import json
+import threading
+
+# Latency bucket upper bounds in seconds, roughly log spaced from 1ms to 60s.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5,
+                   2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0)
+
+
+class Histogram(object):
+    """ Fixed-bucket latency histogram, percentiles are interpolated within a bucket. """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "buckets": self.buckets,
+            "counts": self.counts
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["buckets"])
+        histogram.counts = list(data["counts"])
+        histogram.count = data["count"]
+        histogram.sum = data["sum"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class HdrHistogram(object):
+    """
+    Log-linear latency histogram in the style of HdrHistogram: values are kept in microseconds, exact below
+    2 * SUB_BUCKETS and within 1 / SUB_BUCKETS of the true value above, so tail percentiles stay accurate
+    from microseconds to minutes. Buckets are sparse, an empty histogram costs almost nothing.
+    """
+    SUB_BUCKETS = 64
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _index(self, micros):
+        if micros < 2 * self.SUB_BUCKETS:
+            return micros
+        shift = micros.bit_length() - self.SUB_BUCKETS.bit_length()
+        return (shift + 1) * self.SUB_BUCKETS + (micros >> shift) - self.SUB_BUCKETS
+
+    def _value(self, index):
+        """ Midpoint of bucket index, in seconds. """
+        if index < 2 * self.SUB_BUCKETS:
+            return index / 1e6
+        shift = index // self.SUB_BUCKETS - 1
+        lowest = (index - shift * self.SUB_BUCKETS) << shift
+        return (lowest + (1 << shift) / 2) / 1e6
+
+    def observe(self, value):
+        index = self._index(int(value * 1e6))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.max, self._value(index))
+        return self.max
+
+    def percentiles(self, qs=(50, 75, 90, 95, 99, 99.9)):
+        """ :return: (dict) "p50": seconds, ... for each of qs, plus mean and max """
+        result = {"mean": self.sum / self.count if self.count else 0.0}
+        for q in qs:
+            result["p%g" % q] = self.percentile(q)
+        result["max"] = self.max
+        return result
+
+
+class EndpointMetrics(object):
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = {}
+        self.retries = 0
+        self.collapsed = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+
+class MetricsRegistry(object):
+    """
+    Per-endpoint request metrics for a Client: latency histograms, status code counters (connection
+    failures count as status "error"), retries, calls collapsed into another thread's in-flight request
+    and request/response body bytes.
+    Can be exported as a JSON snapshot or in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _endpoint(self, endpoint):
+        metrics = self._endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self._endpoints[endpoint] = EndpointMetrics()
+        return metrics
+
+    def observe(self, endpoint, latency, status, request_bytes=0, response_bytes=0):
+        status = str(status)
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics.latency.observe(latency)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.request_bytes += request_bytes
+            metrics.response_bytes += response_bytes
+
+    def record_retry(self, endpoint):
+        with self._lock:
+            self._endpoint(endpoint).retries += 1
+
+    def record_collapsed(self, endpoint):
+        with self._lock:
+            self._endpoint(endpoint).collapsed += 1
+
+    def snapshot(self, include_histograms=True):
+        with self._lock:
+            snapshot = {}
+            for endpoint, metrics in sorted(self._endpoints.items()):
+                snapshot[endpoint] = {
+                    "requests": metrics.latency.count,
+                    "statuses": dict(metrics.statuses),
+                    "retries": metrics.retries,
+                    "collapsed": metrics.collapsed,
+                    "request_bytes": metrics.request_bytes,
+                    "response_bytes": metrics.response_bytes,
+                    "latency_seconds": {
+                        "mean": metrics.latency.sum / metrics.latency.count if metrics.latency.count else 0.0,
+                        "p50": metrics.latency.percentile(50),
+                        "p95": metrics.latency.percentile(95),
+                        "p99": metrics.latency.percentile(99),
+                        "max": metrics.latency.max
+                    }
+                }
+                if include_histograms:
+                    snapshot[endpoint]["histogram"] = metrics.latency.as_dict()
+            return snapshot
+
+    def merge(self, snapshot):
+        """ Adds a snapshot (e.g. from another process) taken with include_histograms=True into this registry. """
+        with self._lock:
+            for endpoint, data in snapshot.items():
+                metrics = self._endpoint(endpoint)
+                metrics.latency.merge(Histogram.from_dict(data["histogram"]))
+                for status, count in data["statuses"].items():
+                    metrics.statuses[status] = metrics.statuses.get(status, 0) + count
+                metrics.retries += data["retries"]
+                metrics.collapsed += data.get("collapsed", 0)
+                metrics.request_bytes += data["request_bytes"]
+                metrics.response_bytes += data["response_bytes"]
+
+    def to_json(self, indent=4):
+        return json.dumps(self.snapshot(include_histograms=False), indent=indent)
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP memd_api_request_duration_seconds MEMD API request latency.",
+            "# TYPE memd_api_request_duration_seconds histogram"
+        ]
+        for endpoint, data in snapshot.items():
+            histogram = data["histogram"]
+            cumulative = 0
+            for bound, count in zip(list(histogram["buckets"]) + ["+Inf"], histogram["counts"]):
+                cumulative += count
+                lines.append(f'memd_api_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+            lines.append(f'memd_api_request_duration_seconds_sum{{endpoint="{endpoint}"}} {histogram["sum"]}')
+            lines.append(f'memd_api_request_duration_seconds_count{{endpoint="{endpoint}"}} {histogram["count"]}')
+        lines += [
+            "# HELP memd_api_request_latency_seconds MEMD API request latency percentiles.",
+            "# TYPE memd_api_request_latency_seconds summary"
+        ]
+        for endpoint, data in snapshot.items():
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                lines.append(f'memd_api_request_latency_seconds{{endpoint="{endpoint}",quantile="{quantile}"}} '
+                             f'{data["latency_seconds"][key]}')
+        lines += [
+            "# HELP memd_api_responses_total MEMD API responses by status code.",
+            "# TYPE memd_api_responses_total counter"
+        ]
+        for endpoint, data in snapshot.items():
+            for status, count in sorted(data["statuses"].items()):
+                lines.append(f'memd_api_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+        for name, key, help_text in (("memd_api_retries_total", "retries", "Retried MEMD API requests."),
+                                     ("memd_api_collapsed_total", "collapsed",
+                                      "Calls that shared another thread's in-flight request."),
+                                     ("memd_api_request_bytes_total", "request_bytes", "Request body bytes sent."),
+                                     ("memd_api_response_bytes_total", "response_bytes", "Response body bytes received.")):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for endpoint, data in snapshot.items():
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {data[key]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """ Writes the metrics to path, JSON for .json files and the Prometheus text format otherwise. """
+        content = self.to_json() + "\n" if path.endswith(".json") else self.to_prometheus()
+        with open(path, "w") as fp:
+            fp.write(content)
@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_MIRROR_PATH = os.path.join(os.path.expanduser("~/.memd_api"), "members.db")
+
+
+class MemberMirror(object):
+    """
+    Local SQLite copy of every member and policy seen through a Client.
+
+    Members are indexed by externalID, email, name and active plancode and are refreshed from each
+    /v1/partnermember response, so listing and filtering never needs to call MEMD.
+    """
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS members (
+            external_id TEXT PRIMARY KEY,
+            email TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            active_plancode TEXT,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS members_email ON members (email COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS members_name ON members (last_name COLLATE NOCASE, first_name COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS members_active_plancode ON members (active_plancode)",
+        """CREATE TABLE IF NOT EXISTS policies (
+            external_id TEXT NOT NULL,
+            plancode TEXT,
+            policy_id TEXT,
+            isactive INTEGER NOT NULL,
+            benefitstart TEXT,
+            benefitend TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS policies_member ON policies (external_id)",
+        "CREATE INDEX IF NOT EXISTS policies_plancode ON policies (plancode, isactive)"
+    )
+
+    def __init__(self, path=DEFAULT_MIRROR_PATH):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _member_row(member_data):
+        name = member_data.get("name") or {}
+        policies = member_data.get("policies") or []
+        active = [p.get("plancode") for p in policies if p.get("isactive")]
+        return (
+            member_data["externalID"],
+            member_data.get("email"),
+            name.get("first", name.get("First")),
+            name.get("last", name.get("Last")),
+            active[0] if active else None,
+            json.dumps(member_data, default=str),
+            time.time()
+        )
+
+    def record_member(self, member_data):
+        """ Inserts or refreshes a member and its policies from a /v1/partnermember response. """
+        if not isinstance(member_data, dict) or "externalID" not in member_data:
+            return
+        policies = member_data.get("policies")
+        with self._lock, self._conn:
+            if policies is None:
+                # Partial responses (e.g. to a PUT) keep the known policies, and the active_plancode derived
+                # from them, instead of marking the member as having no plan.
+                existing = self._conn.execute("SELECT data FROM members WHERE external_id = ?",
+                                              (member_data["externalID"],)).fetchone()
+                known = None if existing is None else json.loads(existing["data"]).get("policies")
+                if known is not None:
+                    member_data = dict(member_data, policies=known)
+            row = self._member_row(member_data)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO members (external_id, email, first_name, last_name, active_plancode, data, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+            # Policies are only replaced when the response lists them, partial responses keep what we know.
+            if policies is not None:
+                self._conn.execute("DELETE FROM policies WHERE external_id = ?", (row[0],))
+                self._conn.executemany(
+                    "INSERT INTO policies (external_id, plancode, policy_id, isactive, benefitstart, benefitend) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(row[0], p.get("plancode"), None if p.get("policyId") is None else str(p.get("policyId")),
+                      1 if p.get("isactive") else 0, p.get("benefitstart"), p.get("benefitend")) for p in policies])
+
+    def get(self, external_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM members WHERE external_id = ?", (external_id,)).fetchone()
+        return None if row is None else json.loads(row["data"])
+
+    def _where(self, plancode=None, inactive=False, email=None, name=None):
+        clauses, params = [], []
+        if plancode is not None:
+            clauses.append("EXISTS (SELECT 1 FROM policies p WHERE p.external_id = m.external_id "
+                           "AND p.plancode = ? AND p.isactive = 1)")
+            params.append(plancode)
+        if inactive:
+            clauses.append("m.active_plancode IS NULL")
+        if email is not None:
+            clauses.append("m.email = ? COLLATE NOCASE")
+            params.append(email)
+        if name is not None:
+            parts = name.split()
+            if len(parts) >= 2:
+                clauses.append("m.first_name = ? COLLATE NOCASE AND m.last_name = ? COLLATE NOCASE")
+                params.extend([parts[0], parts[-1]])
+            else:
+                clauses.append("(m.last_name = ? COLLATE NOCASE OR m.first_name = ? COLLATE NOCASE)")
+                params.extend([name, name])
+        return clauses, params
+
+    def count(self, plancode=None, inactive=False, email=None, name=None):
+        clauses, params = self._where(plancode=plancode, inactive=inactive, email=email, name=name)
+        sql = "SELECT COUNT(*) FROM members m"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def iter_members(self, plancode=None, inactive=False, email=None, name=None, limit=None, offset=0, after=None,
+                     full=False):
+        """
+        Yields mirrored members ordered by externalID.
+        :param plancode: (str) Only members with this plancode active
+        :param inactive: (bool) Only members without any active policy
+        :param email: (str) Case-insensitive email match
+        :param name: (str) "First Last" or a single first or last name, case-insensitive
+        :param after: (str) Keyset paging, only members whose externalID sorts after this one
+        :param full: (bool) Yield the whole stored response instead of the indexed summary columns
+        """
+        clauses, params = self._where(plancode=plancode, inactive=inactive, email=email, name=name)
+        if after is not None:
+            clauses.append("m.external_id > ?")
+            params.append(after)
+        columns = "m.data" if full else "m.external_id, m.first_name, m.last_name, m.email, m.active_plancode"
+        sql = f"SELECT {columns} FROM members m"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY m.external_id LIMIT ? OFFSET ?"
+        params.extend([-1 if limit is None else limit, offset])
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        for row in rows:
+            if full:
+                yield json.loads(row["data"])
+            else:
+                yield {
+                    "externalID": row["external_id"],
+                    "first": row["first_name"],
+                    "last": row["last_name"],
+                    "email": row["email"],
+                    "active_plancode": row["active_plancode"]
+                }
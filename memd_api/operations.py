@@ -0,0 +1,70 @@
+"""
+The member operations behind the CLI commands, as plain functions of a Client and JSON-able parameters.
+The CLI runs them in process, or forwards them to a running `memd-api serve` daemon.
+"""
+
+
+def create(client, member):
+    """ :return: the created member's data """
+    return client.create_primary_member(member)._data
+
+
+def inspect(client, external_id):
+    """ :return: the member's data """
+    return client.get_primary_member(external_id)._data
+
+
+def update(client, external_id, fields, dry_run=False):
+    """ :return: the PUT response, or the payload for dry runs """
+    member = client.get_primary_member(external_id)
+    fields = {k: v for k, v in fields.items() if k != "externalID"}
+    return member.update(dry_run=dry_run, **fields)
+
+
+def add_policy(client, external_id, plancode, dry_run=False):
+    """ :return: {"response": create_policy result, "member": the member's data afterwards} """
+    member = client.get_primary_member(external_id)
+    response = member.create_policy(plancode, dry_run=dry_run)
+    return {"response": response, "member": member._data}
+
+
+def rm(client, external_id, dry_run=False):
+    """ :return: the deactivate_policies result """
+    member = client.get_primary_member(external_id)
+    return member.deactivate_policies(dry_run=dry_run)
+
+
+def ensure_created(client, member):
+    """ create that can be repeated: returns the member if an earlier attempt already created it. """
+    return client.get_or_create_primary_member(member, ensure_plancode=False)._data
+
+
+def ensure_policy(client, external_id, plancode, dry_run=False):
+    """ add_policy that can be repeated: does nothing if plancode is already active. """
+    member = client.get_primary_member(external_id)
+    response = member.ensure_plancode(plancode, dry_run=dry_run)
+    return {"response": response, "member": member._data}
+
+
+OPERATIONS = {
+    "create": create,
+    "inspect": inspect,
+    "update": update,
+    "add_policy": add_policy,
+    "rm": rm
+}
+
+# For operations that may or may not have landed before, e.g. in flight when a batch was killed.
+# update and rm already converge on the same state when repeated.
+RETRY_OPERATIONS = dict(OPERATIONS, create=ensure_created, add_policy=ensure_policy)
+
+
+def run(client, op, params, retry=False):
+    """
+    :param retry: (bool) Use the variant of op that is safe to repeat
+    """
+    try:
+        func = (RETRY_OPERATIONS if retry else OPERATIONS)[op]
+    except KeyError:
+        raise ValueError(f"Unknown operation {op}")
+    return func(client, **params)
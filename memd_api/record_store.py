@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+def name_key(member_data):
+    """ "first_last" in lower case, from a payload ({"First", "Last"}) or a MEMD response ({"first", "last"}). """
+    name = member_data.get("name") or {}
+    first = name.get("First", name.get("first")) or ""
+    last = name.get("Last", name.get("last")) or ""
+    return f"{first.lower()}_{last.lower()}"
+
+
+class RecordStore(object):
+    """
+    Append-only log of the payloads and responses recorded in test mode, replacing one JSON file per
+    member in each of create/, response/ and current/.
+
+    Records are kept in SQLite indexed by externalID and by "first_last" name key, so members with the
+    same name no longer overwrite each other and lookups don't scan files. record() only queues the
+    record, a background thread writes queued records in batches. Reads flush the queue first.
+    """
+    KINDS = ("create", "response", "update", "current")
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS records (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            external_id TEXT,
+            name_key TEXT,
+            data TEXT NOT NULL,
+            recorded_at REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS records_external_id ON records (external_id, kind, seq)",
+        "CREATE INDEX IF NOT EXISTS records_name_key ON records (name_key, kind, seq)"
+    )
+    BATCH_SIZE = 500
+
+    def __init__(self, path, max_queued=10000):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._writer = threading.Thread(target=self._write_loop, name="memd-record-store", daemon=True)
+        self._writer.start()
+
+    def record(self, kind, data):
+        """ Queues data for writing, returns without waiting for the disk. """
+        if kind not in self.KINDS:
+            raise ValueError(f"kind must be one of {self.KINDS}, got {kind}")
+        row = (kind, data.get("externalID"), name_key(data), json.dumps(data, default=str), time.time())
+        self._queue.put(row)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            batch, done = [], []
+            while item is not None:
+                if isinstance(item, threading.Event):
+                    done.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= self.BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with self._lock, self._conn:
+                        self._conn.executemany(
+                            "INSERT INTO records (kind, external_id, name_key, data, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                            batch)
+                except sqlite3.Error as exc:
+                    # Recording is a test-mode convenience, never fail the command over it.
+                    self.logger.warning("Unable to write %s record(s) to %s: %s", len(batch), self.path, exc)
+            for event in done:
+                event.set()
+            if item is None:
+                return
+
+    def flush(self):
+        """ Blocks until everything recorded so far is written. """
+        if not self._writer.is_alive():
+            return
+        event = threading.Event()
+        self._queue.put(event)
+        event.wait()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        with self._lock:
+            self._conn.close()
+
+    def latest(self, external_id=None, name=None, kinds=None):
+        """
+        The most recent record for an externalID or "first_last" name key.
+        :param kinds: Only records of these kinds, default any
+        """
+        clauses, params = [], []
+        if external_id is not None:
+            clauses.append("external_id = ?")
+            params.append(external_id)
+        if name is not None:
+            clauses.append("name_key = ?")
+            params.append(name.lower())
+        if kinds:
+            clauses.append("kind IN (%s)" % ", ".join("?" * len(kinds)))
+            params.extend(kinds)
+        sql = "SELECT data FROM records"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY seq DESC LIMIT 1"
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def external_ids(self, name):
+        """ Every externalID recorded under a "first_last" name key, most recent first. """
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT external_id, MAX(seq) AS last_seq FROM records WHERE name_key = ? AND external_id IS NOT NULL "
+                "GROUP BY external_id ORDER BY last_seq DESC", (name.lower(),)).fetchall()
+        return [row[0] for row in rows]
@@ -0,0 +1,169 @@
+import logging
+import multiprocessing
+import queue
+import tempfile
+import time
+import zlib
+
+from .bulk import BulkSummary, sync_roster
+from .log import forward_worker_logs, log_to_queue
+from .metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+# Rows are sent to the workers in chunks, one pickle per chunk instead of per row.
+CHUNK_SIZE = 100
+# Seconds the remaining workers get to finish their rows after a shard failed.
+STOP_TIMEOUT = 10.0
+
+
+def shard_of(external_id, shards):
+    """ Stable shard for an externalID: the same member always goes to the same worker process. """
+    return zlib.crc32(str(external_id).encode("utf-8")) % shards
+
+
+def _iter_queue(rows_queue):
+    while True:
+        chunk = rows_queue.get()
+        if chunk is None:
+            return
+        for row in chunk:
+            yield row
+
+
+def _sync_shard(shard, dict_config, token_dir, mirror_path, rate_limiter, rows_queue, results_queue, workers,
+                dry_run, log_queue, log_level):
+    """ Worker process: syncs the rows of one shard with its own Client and reports (shard, summary, metrics). """
+    log_to_queue(log_queue, log_level)
+    from .client import Client
+    from .token_store import FileTokenStore
+    mirror = None
+    if mirror_path is not None:
+        from .mirror import MemberMirror
+        mirror = MemberMirror(mirror_path)
+    try:
+        client = Client(dict_config, token_store=FileTokenStore(token_dir), mirror=mirror,
+                        rate_limiter=rate_limiter)
+        summary = sync_roster(client, _iter_queue(rows_queue), workers=workers, dry_run=dry_run)
+        results_queue.put((shard, summary, client.metrics.snapshot(include_histograms=True), None))
+    except Exception as exc:
+        logger.exception("Shard %s failed", shard)
+        results_queue.put((shard, None, None, str(exc)))
+        # Drain the queue so the parent never blocks feeding a dead shard.
+        for _ in _iter_queue(rows_queue):
+            pass
+
+
+def _stop_shards(procs, rows_queues, results_queue, timeout=STOP_TIMEOUT):
+    """
+    Ends the workers still running after a shard failed: each gets the end of its rows, and those that don't
+    exit within timeout seconds are terminated. Does nothing once every worker has exited.
+    """
+    for proc, rows_queue in zip(procs, rows_queues):
+        if proc.is_alive():
+            try:
+                rows_queue.put(None, timeout=0.1)
+            except queue.Full:
+                pass
+        # Rows nobody will read mustn't keep this process from exiting.
+        rows_queue.cancel_join_thread()
+    deadline = time.monotonic() + timeout
+    started = [proc for proc in procs if proc.pid is not None]
+    while time.monotonic() < deadline and any(proc.is_alive() for proc in started):
+        # A worker can't exit before its result is read, the results of a failed run are dropped.
+        try:
+            results_queue.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    for proc in started:
+        if proc.is_alive():
+            logger.warning("Terminating %s", proc.name)
+            proc.terminate()
+        proc.join()
+
+
+def sync_roster_sharded(dict_config, rows, processes=4, workers=8, dry_run=False, token_dir=None,
+                        mirror_path=None, rate_limit=0, metrics=None):
+    """
+    sync_roster across worker processes, each owning the members whose externalID hashes to its shard.
+    Every process has its own Client and connection pool. They share one bearer token through a
+    FileTokenStore and, with rate_limit, one requests-per-second budget.
+    :param dict_config: (dict) Client dict_config for the workers
+    :param rows: Iterable of member dicts, read once and streamed to the workers
+    :param processes: (int) Number of worker processes
+    :param workers: (int) Threads per worker process
+    :param token_dir: (str) FileTokenStore directory, a temporary one is used if not set
+    :param mirror_path: (str) If set, every worker records members in the MemberMirror at this path
+    :param rate_limit: (float) Requests per second across all processes, 0 is unlimited
+    :param metrics: (MetricsRegistry) Worker metrics are merged into it, a new one is created if not set
+    :return: (summary, metrics, shards) the merged BulkSummary and MetricsRegistry, and per shard summaries
+    """
+    from .throttle import RateLimiter
+    metrics = metrics if metrics is not None else MetricsRegistry()
+    rate_limiter = RateLimiter(rate_limit, shared=True) if rate_limit else None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        token_dir = token_dir or tmp_dir
+        # Fetch the token once here, the workers pick it up from the store instead of all authenticating.
+        from .client import Client
+        from .token_store import FileTokenStore
+        Client(dict_config, token_store=FileTokenStore(token_dir)).access_token
+
+        summary = BulkSummary()
+        results_queue = multiprocessing.Queue()
+        log_queue, log_listener = forward_worker_logs()
+        rows_queues = [multiprocessing.Queue(maxsize=4) for _ in range(processes)]
+        procs = [multiprocessing.Process(target=_sync_shard, name=f"memd-shard-{shard}",
+                                         args=(shard, dict_config, token_dir, mirror_path, rate_limiter,
+                                               rows_queues[shard], results_queue, workers, dry_run, log_queue,
+                                               logging.getLogger().getEffectiveLevel()))
+                 for shard in range(processes)]
+        try:
+            for proc in procs:
+                proc.start()
+
+            def put(shard, item):
+                while True:
+                    try:
+                        rows_queues[shard].put(item, timeout=1.0)
+                        return
+                    except queue.Full:
+                        if not procs[shard].is_alive():
+                            raise RuntimeError(f"Shard {shard} worker exited with code {procs[shard].exitcode}")
+
+            chunks = [[] for _ in range(processes)]
+            for row in rows:
+                shard = shard_of(row.get("externalID") if isinstance(row, dict) else row, processes)
+                chunks[shard].append(row)
+                if len(chunks[shard]) >= CHUNK_SIZE:
+                    put(shard, chunks[shard])
+                    chunks[shard] = []
+            for shard in range(processes):
+                if chunks[shard]:
+                    put(shard, chunks[shard])
+                put(shard, None)
+
+            shards = {}
+            while len(shards) < processes:
+                try:
+                    shard, shard_summary, snapshot, error = results_queue.get(timeout=1.0)
+                except queue.Empty:
+                    dead = [p for i, p in enumerate(procs) if i not in shards and not p.is_alive()]
+                    if dead:
+                        raise RuntimeError(f"Worker {dead[0].name} exited with code {dead[0].exitcode}")
+                    continue
+                if error is not None:
+                    shards[shard] = {"shard": shard, "error": error}
+                    continue
+                summary.merge(shard_summary)
+                metrics.merge(snapshot)
+                shard_report = shard_summary.as_dict()
+                del shard_report["errors"]
+                shards[shard] = dict(shard=shard, **shard_report)
+            for proc in procs:
+                proc.join()
+        finally:
+            _stop_shards(procs, rows_queues, results_queue)
+            # Writes out what the workers logged last.
+            log_listener.stop()
+    summary.finish()
+    return summary, metrics, [shards[shard] for shard in range(processes)]
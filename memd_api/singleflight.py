@@ -0,0 +1,61 @@
+import threading
+
+
+class _Call(object):
+    __slots__ = ("done", "result", "exc")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc = None
+
+
+class SingleFlight(object):
+    """
+    Collapses concurrent calls with the same key into one: the first caller runs the function, callers that
+    arrive while it is in flight wait and get its result or exception. Keys are tuples whose first item
+    names the kind of call, counters are kept per kind.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {}
+
+    def do(self, key, func):
+        """
+        :return: (result, shared) shared is True if the result came from a call made by another thread
+        """
+        with self._lock:
+            stats = self._stats.setdefault(key[0], {"calls": 0, "collapsed": 0})
+            stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                stats["collapsed"] += 1
+        if not leader:
+            call.done.wait()
+            if call.exc is not None:
+                raise call.exc
+            return call.result, True
+        try:
+            call.result = func()
+        except BaseException as exc:
+            call.exc = exc
+            raise
+        finally:
+            self.forget(key, call)
+            call.done.set()
+        return call.result, False
+
+    def forget(self, key, call=None):
+        """ Later callers start a new call for key instead of joining the one in flight, e.g. after a write. """
+        with self._lock:
+            if call is None or self._calls.get(key) is call:
+                self._calls.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {kind: dict(stats) for kind, stats in self._stats.items()}
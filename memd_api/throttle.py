@@ -0,0 +1,179 @@
+import threading
+import time
+
+from requests.exceptions import RequestException
+
+
+class CircuitOpenError(RequestException):
+    """ Raised instead of sending a request while the endpoint's circuit breaker is open. """
+
+
+class AdaptiveLimiter(object):
+    """
+    AIMD concurrency limit shared by every thread using a Client.
+
+    The limit grows by about one slot per limit's worth of healthy responses and is halved when MEMD
+    answers 429/5xx, a connection fails, or latency rises above latency_tolerance times the endpoint's
+    baseline. Only one decrease happens per round trip: responses to requests sent before the last
+    decrease don't shrink the limit again. Latency jitter below latency_floor seconds is ignored.
+
+    Baselines are kept per endpoint, since token, member and policy calls have different latencies.
+    Slow responses pull the baseline toward them by baseline_decay, so after a lasting latency shift the
+    baseline catches up and the limit grows again instead of staying at the minimum.
+    """
+
+    def __init__(self, initial=10, minimum=1, maximum=64, backoff=0.5, latency_tolerance=2.0, latency_floor=0.05,
+                 baseline_decay=0.05):
+        if not minimum <= initial <= maximum:
+            raise ValueError(f"Concurrency limits must satisfy {minimum} <= {initial} <= {maximum}")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.latency_floor = latency_floor
+        self.baseline_decay = baseline_decay
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._baselines = {}
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self):
+        """ Blocks until a slot is free, returns the start time to hand back to release. """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+        return time.monotonic()
+
+    def release(self, started, overloaded=False, endpoint=None):
+        """
+        :param endpoint: Name the latency baseline is kept under
+        """
+        now = time.monotonic()
+        latency = now - started
+        with self._condition:
+            self._in_flight -= 1
+            baseline = self._baselines.get(endpoint)
+            slow = baseline is not None and latency > max(baseline * self.latency_tolerance,
+                                                          baseline + self.latency_floor)
+            if overloaded or slow:
+                if started >= self._last_decrease:
+                    self._limit = max(float(self.minimum), self._limit * self.backoff)
+                    self._last_decrease = now
+                if slow and not overloaded:
+                    self._baselines[endpoint] = baseline + (latency - baseline) * self.baseline_decay
+            else:
+                self._limit = min(float(self.maximum), self._limit + 1.0 / self._limit)
+                self._baselines[endpoint] = latency if baseline is None else baseline * 0.9 + latency * 0.1
+            self._condition.notify_all()
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "minimum": self.minimum,
+                "maximum": self.maximum,
+                "baseline_latency_ms": {str(endpoint): round(baseline * 1000, 2)
+                                        for endpoint, baseline in self._baselines.items()}
+            }
+
+
+class CircuitBreaker(object):
+    """
+    Opens after failure_threshold consecutive failures and fails fast for reset_timeout seconds.
+    Then one trial request is let through (half open): success closes the breaker, failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def before_call(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(f"Circuit breaker for {self.name} is open, retry in {retry_in:.1f}s")
+
+    def record(self, failed):
+        with self._lock:
+            if not failed:
+                self._state = self.CLOSED
+                self._failures = 0
+                self._trial_in_flight = False
+                return
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self._current_state(), "consecutive_failures": self._failures}
+
+
+class RateLimiter(object):
+    """
+    Token bucket allowing rate requests per second with bursts of up to burst requests.
+    With shared=True the bucket lives in shared memory behind a process lock, so handing the limiter to
+    worker processes when they start makes them all draw from one budget.
+    """
+
+    def __init__(self, rate, burst=None, shared=False):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(1.0, self.rate)
+        if shared:
+            import multiprocessing
+            self._lock = multiprocessing.Lock()
+            # [tokens, time.monotonic() of the last refill], CLOCK_MONOTONIC is the same in every process.
+            self._state = multiprocessing.Array("d", [self.burst, time.monotonic()], lock=False)
+        else:
+            self._lock = threading.Lock()
+            self._state = [self.burst, time.monotonic()]
+
+    def acquire(self):
+        """ Blocks until a request may be sent. """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens = min(self.burst, self._state[0] + (now - self._state[1]) * self.rate)
+                self._state[1] = now
+                if tokens >= 1.0:
+                    self._state[0] = tokens - 1.0
+                    return
+                self._state[0] = tokens
+                wait = (1.0 - tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,92 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_TOKEN_DIR = os.path.join(os.path.expanduser("~/.memd_api"), "tokens")
+
+
+class FileTokenStore(object):
+    """
+    Shares bearer tokens between Client instances, threads and processes.
+
+    Tokens are kept in one JSON file per (base_url, username, client_id) under directory, readable by the
+    owner only. lock() serializes refreshes: an in-process lock for threads and an exclusive file lock
+    for other processes, so when many callers find the token expired only the first one fetches it.
+    """
+    _thread_locks = {}
+    _thread_locks_guard = threading.Lock()
+
+    def __init__(self, directory=DEFAULT_TOKEN_DIR):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+
+    @staticmethod
+    def key_for(base_url, username, client_id):
+        return hashlib.sha256(f"{base_url}|{username}|{client_id}".encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, key, suffix=".json"):
+        return os.path.join(self.directory, key + suffix)
+
+    def load(self, key):
+        """
+        :return: (dict) with access_token, token_type, expires_in and obtained_at (epoch seconds) or None
+        """
+        try:
+            with open(self._path(key), "r") as fp:
+                token = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if not all(k in token for k in ("access_token", "token_type", "expires_in", "obtained_at")):
+            return None
+        return token
+
+    def save(self, key, token):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as fp:
+            json.dump(token, fp)
+        os.replace(tmp_path, path)
+
+    def clear(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _thread_lock(self, key):
+        with self._thread_locks_guard:
+            return self._thread_locks.setdefault((self.directory, key), threading.Lock())
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        with self._thread_lock(key):
+            fd = os.open(self._path(key, ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                start = time.monotonic()
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                self.logger.debug("Acquired token lock for %s in %.3fs", key, time.monotonic() - start)
+                yield
+            finally:
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                    else:
+                        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+                finally:
+                    os.close(fd)
@@ -13,3 +13,26 @@ def load_env(name, default=None):
     if default is not None:
         return default
     raise ValueError(f'Environment Variable {name} is not defined and is required.')
+
+
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Not a boolean value: {value}")
+
+
+def to_int_tuple(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(int(v) for v in value)
+    return tuple(int(v) for v in str(value).split(",") if v.strip())
+
+
+def to_optional_float(value):
+    if value is None or str(value).strip().lower() in ("", "none"):
+        return None
+    return float(value)
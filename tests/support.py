@@ -0,0 +1,31 @@
+"""
+Shared helpers for the tests: a FakeMemdServer started around each test, and make_member re-exported.
+"""
+import shutil
+import tempfile
+import unittest
+
+from memd_api.client import Client
+from memd_api.fake_server import FakeMemdServer, make_member  # noqa: F401
+
+
+class FakeServerTestCase(unittest.TestCase):
+    """ Starts a FakeMemdServer and a temporary directory for every test. """
+    server_options = {}
+
+    def setUp(self):
+        self.server = FakeMemdServer(**self.server_options).start()
+        self.addCleanup(self.server.stop)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+
+    def make_client(self, **settings):
+        """ :param settings: Client SETTINGS, plus token_store, mirror, metrics or rate_limiter """
+        kwargs = {k: settings.pop(k) for k in ("token_store", "mirror", "metrics", "rate_limiter") if k in settings}
+        return Client(self.server.dict_config(**settings), **kwargs)
+
+    def create_member(self, **fields):
+        """ Adds a member straight to the server, returns the payload. """
+        member = make_member(**fields)
+        self.server.create_member(member)
+        return member
@@ -0,0 +1,49 @@
+import asyncio
+import unittest
+
+from memd_api.async_client import AsyncClient
+from support import FakeServerTestCase, make_member
+
+
+class AsyncClientTest(FakeServerTestCase):
+    server_options = {"latency": 0.05}
+
+    def test_limiter_is_sized_from_max_concurrency(self):
+        client = AsyncClient(self.server.dict_config(), max_concurrency=40)
+        self.assertEqual(client.client.limiter.limit, 40)
+        self.assertEqual(client.client.limiter.maximum, 64)
+        client = AsyncClient(self.server.dict_config(concurrency_max=5), max_concurrency=40)
+        self.assertEqual(client.client.limiter.limit, 5)
+        with self.assertRaises(ValueError):
+            AsyncClient(self.server.dict_config(), max_concurrency=0)
+
+    def test_concurrent_gets_and_writes(self):
+        members = [self.create_member(index=i) for i in range(20)]
+
+        async def main():
+            async with AsyncClient(self.server.dict_config(), max_concurrency=20) as client:
+                fetched = await asyncio.gather(*(client.get_primary_member(m["externalID"]) for m in members))
+                await asyncio.gather(*(member.update(phone=f"480-555-{i:04d}") for i, member in enumerate(fetched)))
+                created = await asyncio.gather(*(client.create_primary_member(make_member(100 + i))
+                                                 for i in range(5)))
+                return fetched, created
+
+        fetched, created = asyncio.run(main())
+        self.assertEqual([m.externalID for m in fetched], [m["externalID"] for m in members])
+        for i, member in enumerate(members):
+            self.assertEqual(self.server.members[member["externalID"]]["phone"], f"480-555-{i:04d}")
+        self.assertEqual(len(self.server.members), 25)
+        self.assertEqual(len({m.externalID for m in created}), 5)
+        self.assertEqual(self.server.requests["token"], 1)
+
+    def test_token_is_fetched_once(self):
+        async def main():
+            async with AsyncClient(self.server.dict_config()) as client:
+                return await asyncio.gather(*(client.get_access_token() for _ in range(10)))
+
+        self.assertEqual(len(set(asyncio.run(main()))), 1)
+        self.assertEqual(self.server.requests["token"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import time
+import unittest
+
+from memd_api.cache import MemberCache
+from support import FakeServerTestCase
+
+
+class MemberCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = MemberCache(max_entries=2)
+        cache.put("a", {"n": 1})
+        cache.put("b", {"n": 2})
+        cache.get("a")
+        cache.put("c", {"n": 3})
+        self.assertEqual(cache.get("b"), (None, None))
+        self.assertEqual(cache.get("a"), ({"n": 1}, None))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_stale_entry_returns_its_etag(self):
+        cache = MemberCache(ttl=0.01)
+        cache.put("a", {"n": 1}, '"v1"')
+        cache.put("b", {"n": 2})
+        time.sleep(0.02)
+        self.assertEqual(cache.get("a"), (None, '"v1"'))
+        self.assertEqual(cache.revalidate("a"), {"n": 1})
+        self.assertEqual(cache.get("a"), ({"n": 1}, '"v1"'))
+        # Without an ETag a stale entry is useless and dropped.
+        self.assertEqual(cache.get("b"), (None, None))
+        self.assertEqual(len(cache), 1)
+
+    def test_callers_get_copies(self):
+        cache = MemberCache()
+        data = {"policies": []}
+        cache.put("a", data)
+        data["policies"].append(1)
+        cached, _ = cache.get("a")
+        cached["policies"].append(2)
+        self.assertEqual(cache.get("a")[0], {"policies": []})
+
+
+class ClientCacheTest(FakeServerTestCase):
+
+    def test_fresh_entries_are_served_from_the_cache(self):
+        client = self.make_client(cache_ttl=60)
+        external_id = self.create_member()["externalID"]
+        client.get_primary_member(external_id)
+        client.get_primary_member(external_id)
+        self.assertEqual(self.server.requests["get_member"], 1)
+        self.assertEqual(client.cache_stats()["hits"], 1)
+
+    def test_stale_entries_are_revalidated_with_the_etag(self):
+        client = self.make_client(cache_ttl=0.05)
+        external_id = self.create_member()["externalID"]
+        client.get_primary_member(external_id)
+        time.sleep(0.06)
+        member = client.get_primary_member(external_id)
+        self.assertEqual(member.externalID, external_id)
+        self.assertEqual(self.server.requests["get_member"], 2)
+        self.assertEqual(client.cache_stats()["revalidated"], 1)
+
+        # Changed on the server: the ETag no longer matches and the new document is cached.
+        self.server.members[external_id]["phone"] = "480-555-0102"
+        time.sleep(0.06)
+        self.assertEqual(client.get_primary_member(external_id).phone, "480-555-0102")
+        self.assertEqual(client.cache_stats()["revalidated"], 1)
+
+    def test_writes_invalidate_the_member(self):
+        client = self.make_client(cache_ttl=60)
+        external_id = self.create_member()["externalID"]
+        client.get_primary_member(external_id).update(phone="480-555-0103")
+        self.assertEqual(client.get_primary_member(external_id).phone, "480-555-0103")
+        self.assertEqual(client.cache_stats()["invalidations"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
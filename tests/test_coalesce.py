@@ -0,0 +1,90 @@
+import json
+import os
+import unittest
+
+from memd_api.bulk import run_batch
+from memd_api.coalesce import MemberPlan, coalesce
+from memd_api.journal import DONE, FAILED, Journal
+from support import FakeServerTestCase, make_member
+
+
+class CoalesceTest(unittest.TestCase):
+
+    def test_groups_operations_by_member(self):
+        entries = [
+            (0, "create", {"member": {"externalID": "a"}}),
+            (1, "update", {"external_id": "b", "fields": {"phone": "1"}}),
+            (2, "update", {"external_id": "a", "fields": {"phone": "2"}}),
+            (3, "update", {"external_id": "a", "fields": {"phone": "3", "email": "a@localhost.com"}}),
+            (4, "add_policy", {"external_id": "a", "plancode": "P1"}),
+            (5, "rm", {"external_id": "b"})
+        ]
+        plans, rejected, separate = coalesce(entries)
+        self.assertEqual((rejected, separate), ([], []))
+        self.assertEqual([plan.external_id for plan in plans], ["a", "b"])
+        a, b = plans
+        self.assertEqual(a.indices, [0, 2, 3, 4])
+        self.assertEqual(a.fields, {"phone": "3", "email": "a@localhost.com"})
+        self.assertEqual(a.policy, "P1")
+        self.assertIsNone(b.policy)
+
+    def test_rejects_invalid_and_separates_dry_runs(self):
+        entries = [
+            (0, "frobnicate", {"external_id": "a"}),
+            (1, "update", {"fields": {}}),
+            (2, "rm", {"external_id": "a", "dry_run": True}),
+            (3, "inspect", {"external_id": "a"})
+        ]
+        plans, rejected, separate = coalesce(entries)
+        self.assertEqual([index for index, _ in rejected], [0, 1])
+        self.assertEqual(separate, [entries[2]])
+        self.assertEqual(plans[0].indices, [3])
+        self.assertIs(plans[0].policy, MemberPlan.UNCHANGED)
+
+
+class CoalescedBatchTest(FakeServerTestCase):
+
+    def run_ops(self, ops):
+        ops_path = os.path.join(self.tmp_dir, "ops.ndjson")
+        with open(ops_path, "w") as fp:
+            for op in ops:
+                fp.write(json.dumps(op) + "\n")
+        journal = Journal(os.path.join(self.tmp_dir, "ops.journal"))
+        summary, stats = run_batch(self.make_client(), ops_path, journal, workers=2, coalesce=True)
+        return summary, stats, journal.states()
+
+    def test_one_create_per_new_member(self):
+        member = make_member(plancode="P1")
+        external_id = member["externalID"]
+        summary, stats, states = self.run_ops([
+            {"op": "create", "member": member},
+            {"op": "update", "external_id": external_id, "fields": {"phone": "480-555-0102"}},
+            {"op": "add-policy", "external_id": external_id, "plancode": "P2"}
+        ])
+        self.assertEqual(summary.failed, 0)
+        self.assertEqual((stats["operations"], stats["members"]), (3, 1))
+        self.assertEqual(states, bytearray([DONE] * 3))
+        self.assertEqual(self.server.requests["create_member"], 1)
+        self.assertNotIn("update_member", self.server.requests)
+        stored = self.server.members[external_id]
+        self.assertEqual(stored["phone"], "480-555-0102")
+        self.assertEqual([p["plancode"] for p in stored["policies"] if p["isactive"]], ["P2"])
+
+    def test_dry_runs_change_nothing(self):
+        member = self.create_member(plancode="P1")
+        external_id = member["externalID"]
+        summary, stats, states = self.run_ops([
+            {"op": "update", "external_id": external_id, "fields": {"phone": "480-555-0102"}, "dry_run": True},
+            {"op": "rm", "external_id": external_id, "dry_run": True},
+            {"op": "launch", "external_id": external_id}
+        ])
+        self.assertEqual((summary.succeeded, summary.failed), (2, 1))
+        self.assertEqual(states, bytearray([DONE, DONE, FAILED]))
+        stored = self.server.members[external_id]
+        self.assertEqual(stored["phone"], member["phone"])
+        self.assertTrue(all(p["isactive"] for p in stored["policies"]))
+        self.assertNotIn("update_member", self.server.requests)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import unittest
+
+from memd_api.bulk import run_batch
+from memd_api.journal import DONE, FAILED, STARTED, Journal
+from support import FakeServerTestCase, make_member
+
+
+class JournalTest(FakeServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.journal_path = os.path.join(self.tmp_dir, "ops.journal")
+
+    def write_journal(self, text):
+        with open(self.journal_path, "w") as fp:
+            fp.write(text)
+
+    def test_states_replay(self):
+        self.write_journal("S 0\nD 0\nS 1\nS 3\nF 3\nS 0\n")
+        self.assertEqual(Journal(self.journal_path).states(), bytearray([DONE, STARTED, 0, FAILED]))
+
+    def test_torn_last_line_is_ignored_and_repaired(self):
+        self.write_journal("S 0\nD 0\nS 1\nD")
+        journal = Journal(self.journal_path)
+        self.assertEqual(journal.states(), bytearray([DONE, STARTED]))
+        with journal:
+            journal.start(2)
+        self.assertEqual(journal.states(), bytearray([DONE, STARTED, STARTED]))
+
+    def test_missing_journal_has_no_states(self):
+        self.assertEqual(Journal(self.journal_path).states(), bytearray())
+
+    def test_resume_skips_done_and_retries_in_flight(self):
+        client = self.make_client()
+        done, in_flight, failed, pending = (make_member(i) for i in range(4))
+        # The first create finished, the second landed on the server before the process was killed.
+        self.server.create_member(done)
+        self.server.create_member(in_flight)
+        ops_path = os.path.join(self.tmp_dir, "ops.ndjson")
+        with open(ops_path, "w") as fp:
+            for member in (done, in_flight, failed, pending):
+                fp.write(json.dumps({"op": "create", "member": member}) + "\n")
+        self.write_journal("S 0\nD 0\nS 1\nS 2\nF 2\n")
+
+        summary, stats = run_batch(client, ops_path, Journal(self.journal_path), workers=2, resume=True)
+        self.assertEqual(summary.failed, 0)
+        self.assertEqual(stats["skipped"], 1)
+        self.assertEqual(stats["operations"], 3)
+        self.assertEqual(Journal(self.journal_path).states(), bytearray([DONE] * 4))
+        self.assertEqual(len(self.server.members), 4)
+
+        # Everything is done, a second resume runs nothing.
+        summary, stats = run_batch(client, ops_path, Journal(self.journal_path), resume=True)
+        self.assertEqual((stats["skipped"], stats["operations"]), (4, 0))
+
+    def test_without_resume_an_in_flight_create_fails(self):
+        client = self.make_client()
+        member = make_member()
+        self.server.create_member(member)
+        ops_path = os.path.join(self.tmp_dir, "ops.ndjson")
+        with open(ops_path, "w") as fp:
+            fp.write(json.dumps({"op": "create", "member": member}) + "\n")
+        summary, _ = run_batch(client, ops_path, Journal(self.journal_path))
+        self.assertEqual(summary.failed, 1)
+        self.assertEqual(Journal(self.journal_path).states(), bytearray([FAILED]))
+
+
+if __name__ == "__main__":
+    unittest.main()
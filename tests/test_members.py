@@ -0,0 +1,82 @@
+import unittest
+
+from support import FakeServerTestCase
+
+
+class PrimaryMemberUpdateTest(FakeServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.make_client()
+        self.external_id = self.create_member()["externalID"]
+
+    def test_update_sends_one_put_without_reloading(self):
+        member = self.client.get_primary_member(self.external_id)
+        member.update(phone="480-555-0102", email="changed@localhost.com")
+        self.assertEqual(self.server.requests["update_member"], 1)
+        self.assertEqual(self.server.requests["get_member"], 1)
+        self.assertEqual(member.phone, "480-555-0102")
+        self.assertEqual(self.server.members[self.external_id]["email"], "changed@localhost.com")
+
+    def test_save_sends_assigned_fields(self):
+        member = self.client.get_primary_member(self.external_id)
+        member.phone = "480-555-0103"
+        member.save()
+        self.assertEqual(self.server.members[self.external_id]["phone"], "480-555-0103")
+        self.assertEqual(member.changes(), {})
+
+    def test_nothing_changed_sends_nothing(self):
+        member = self.client.get_primary_member(self.external_id)
+        member.update()
+        self.assertNotIn("update_member", self.server.requests)
+
+    def test_dry_run_returns_the_payload(self):
+        member = self.client.get_primary_member(self.external_id)
+        payload = member.update(dry_run=True, phone="480-555-0102")
+        self.assertEqual(payload["phone"], "480-555-0102")
+        self.assertNotIn("policies", payload)
+        self.assertNotIn("update_member", self.server.requests)
+
+    def test_reading_name_is_not_a_change(self):
+        # Responses often leave out middle, which MemberName.to_dict() always has.
+        del self.server.members[self.external_id]["name"]["middle"]
+        member = self.client.get_primary_member(self.external_id)
+        self.assertEqual(member.name.first, "Test0")
+        self.assertEqual(member.changes(), {})
+        member.save()
+        self.assertNotIn("update_member", self.server.requests)
+        member.name.middle = "Q"
+        self.assertEqual(member.changes(), {"name": {"first": "Test0", "middle": "Q", "last": "Member"}})
+
+    def test_strict_update_keeps_in_place_edits(self):
+        member = self.client.get_primary_member(self.external_id)
+        member.name.first = "Renamed"
+        # Changed by someone else since the GET, strict reloads before building the payload.
+        self.server.members[self.external_id]["email"] = "other@localhost.com"
+        member.update(strict=True, phone="480-555-0102")
+        stored = self.server.members[self.external_id]
+        self.assertEqual(stored["name"]["first"], "Renamed")
+        self.assertEqual(stored["phone"], "480-555-0102")
+        self.assertEqual(stored["email"], "other@localhost.com")
+        self.assertEqual(member.name.first, "Renamed")
+        self.assertEqual(self.server.requests["update_member"], 1)
+
+
+class DeactivatePoliciesTest(FakeServerTestCase):
+
+    def test_one_pass_and_one_reload(self):
+        client = self.make_client()
+        external_id = self.create_member(plancode="P1")["externalID"]
+        self.server.create_policy(external_id, {"plancode": "P2", "benefitstart": "2026-01-01T00:00:00"})
+        member = client.get_primary_member(external_id)
+        gets = self.server.requests["get_member"]
+        deactivated = member.deactivate_policies()
+        self.assertEqual(sorted(d["plancode"] for d in deactivated), ["P1", "P2"])
+        self.assertEqual(member.active_policies(), [])
+        self.assertEqual(self.server.requests["terminate_policy"], 2)
+        self.assertEqual(self.server.requests["get_member"], gets + 1)
+        self.assertFalse(any(p["isactive"] for p in self.server.members[external_id]["policies"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import unittest
+
+from memd_api.mirror import MemberMirror
+from support import FakeServerTestCase
+
+
+def response(external_id, plancodes=(), inactive=(), **fields):
+    """ A /v1/partnermember response with an active policy per plancode and an inactive one per inactive. """
+    policies = [{"plancode": p, "policyId": i, "isactive": True} for i, p in enumerate(plancodes)]
+    policies += [{"plancode": p, "policyId": 100 + i, "isactive": False} for i, p in enumerate(inactive)]
+    data = {"externalID": external_id, "email": f"{external_id}@localhost.com",
+            "name": {"first": "Test", "last": external_id.title()}, "policies": policies}
+    data.update(fields)
+    return data
+
+
+class MemberMirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mirror = MemberMirror(":memory:")
+        self.addCleanup(self.mirror.close)
+
+    def test_filters(self):
+        self.mirror.record_member(response("ann", ["A1"]))
+        self.mirror.record_member(response("bob", ["B1"], inactive=["A1"]))
+        self.mirror.record_member(response("cid", inactive=["A1"]))
+        self.assertEqual([m["externalID"] for m in self.mirror.iter_members(plancode="A1")], ["ann"])
+        self.assertEqual([m["externalID"] for m in self.mirror.iter_members(inactive=True)], ["cid"])
+        self.assertEqual([m["externalID"] for m in self.mirror.iter_members(email="BOB@localhost.com")], ["bob"])
+        self.assertEqual([m["externalID"] for m in self.mirror.iter_members(name="test ann")], ["ann"])
+        self.assertEqual(self.mirror.count(), 3)
+
+    def test_keyset_paging(self):
+        for external_id in ("a", "b", "c", "d"):
+            self.mirror.record_member(response(external_id))
+        page = list(self.mirror.iter_members(limit=2))
+        self.assertEqual([m["externalID"] for m in page], ["a", "b"])
+        page = list(self.mirror.iter_members(limit=2, after=page[-1]["externalID"]))
+        self.assertEqual([m["externalID"] for m in page], ["c", "d"])
+
+    def test_refresh_replaces_policies(self):
+        self.mirror.record_member(response("ann", ["A1"]))
+        self.mirror.record_member(response("ann", ["B1"], inactive=["A1"]))
+        self.assertEqual(self.mirror.count(plancode="A1"), 0)
+        self.assertEqual(self.mirror.count(plancode="B1"), 1)
+
+    def test_response_without_policies_keeps_the_plan(self):
+        self.mirror.record_member(response("ann", ["A1"]))
+        partial = response("ann", phone="480-555-0102")
+        del partial["policies"]
+        self.mirror.record_member(partial)
+        self.assertEqual(next(self.mirror.iter_members())["active_plancode"], "A1")
+        self.assertEqual(self.mirror.count(plancode="A1"), 1)
+        stored = self.mirror.get("ann")
+        self.assertEqual(stored["phone"], "480-555-0102")
+        self.assertEqual(len(stored["policies"]), 1)
+
+
+class ClientMirrorTest(FakeServerTestCase):
+
+    def test_client_records_what_it_sees(self):
+        mirror = MemberMirror(os.path.join(self.tmp_dir, "members.db"))
+        self.addCleanup(mirror.close)
+        client = self.make_client(mirror=mirror)
+        external_id = self.create_member(plancode="A1")["externalID"]
+        member = client.get_primary_member(external_id)
+        self.assertEqual(mirror.get(external_id)["externalID"], external_id)
+        member.update(phone="480-555-0102")
+        self.assertEqual(mirror.get(external_id)["phone"], "480-555-0102")
+        self.assertEqual(mirror.count(plancode="A1"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from memd_api.record_store import RecordStore, name_key
+
+
+def payload(external_id, first="James", last="Lawson", **fields):
+    data = {"externalID": external_id, "name": {"First": first, "Last": last}}
+    data.update(fields)
+    return data
+
+
+class RecordStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.path = os.path.join(self.tmp_dir, "records.db")
+        self.store = RecordStore(self.path)
+        self.addCleanup(lambda: self.store.close())
+
+    def test_name_key(self):
+        self.assertEqual(name_key(payload("a")), "james_lawson")
+        self.assertEqual(name_key({"name": {"first": "James", "last": "Lawson"}}), "james_lawson")
+        self.assertEqual(name_key({}), "_")
+
+    def test_members_with_the_same_name_are_both_kept(self):
+        self.store.record("create", payload("a", phone="1"))
+        self.store.record("create", payload("b", phone="2"))
+        self.assertEqual(self.store.external_ids("James_Lawson"), ["b", "a"])
+        self.assertEqual(self.store.latest(name="james_lawson")["externalID"], "b")
+        self.assertEqual(self.store.latest(external_id="a")["phone"], "1")
+        self.assertEqual(self.store.latest(external_id="b")["phone"], "2")
+
+    def test_latest_by_kind(self):
+        self.store.record("create", payload("a", phone="1"))
+        self.store.record("response", payload("a", phone="2"))
+        self.store.record("update", payload("a", phone="3"))
+        self.assertEqual(self.store.latest(external_id="a")["phone"], "3")
+        self.assertEqual(self.store.latest(external_id="a", kinds=["create", "response"])["phone"], "2")
+        self.assertEqual(self.store.latest(name="james_lawson", kinds=["create"])["phone"], "1")
+        self.assertIsNone(self.store.latest(name="mary_smith"))
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            self.store.record("deleted", payload("a"))
+
+    def test_records_survive_reopening(self):
+        for i in range(1200):
+            self.store.record("response", payload(f"m{i}", first=f"First{i % 3}"))
+        self.store.close()
+        self.store = RecordStore(self.path)
+        self.assertEqual(len(self.store.external_ids("first1_lawson")), 400)
+        self.assertEqual(self.store.latest(name="first2_lawson")["externalID"], "m1199")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import logging
+import multiprocessing
+import os
+import time
+import unittest
+from unittest import mock
+
+from memd_api.bulk import BulkSummary
+from memd_api.sharding import shard_of, sync_roster_sharded
+from support import FakeServerTestCase, make_member
+
+
+class ShardOfTest(unittest.TestCase):
+
+    def test_stable_and_spread(self):
+        ids = [f"member-{i}" for i in range(400)]
+        shards = [shard_of(external_id, 4) for external_id in ids]
+        self.assertEqual(shards, [shard_of(external_id, 4) for external_id in ids])
+        self.assertEqual(set(shards), {0, 1, 2, 3})
+        self.assertTrue(all(shards.count(shard) > 50 for shard in range(4)))
+
+
+class _Records(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class ShardedSyncTest(FakeServerTestCase):
+
+    def test_results_are_merged(self):
+        rows = [make_member(i, plancode="P1") for i in range(30)]
+        invalid = make_member(30)
+        del invalid["phone"]
+        rows.append(invalid)
+        # On the root logger like configure_logging's handler, worker records come in through it.
+        handler = _Records()
+        logging.getLogger().addHandler(handler)
+        self.addCleanup(logging.getLogger().removeHandler, handler)
+        summary, metrics, shards = sync_roster_sharded(self.server.dict_config(), rows, processes=3, workers=2,
+                                                       token_dir=self.tmp_dir)
+        self.assertEqual((summary.succeeded, summary.failed), (30, 1))
+        self.assertEqual(summary.errors[0]["externalID"], invalid["externalID"])
+        self.assertEqual([shard["shard"] for shard in shards], [0, 1, 2])
+        self.assertEqual(sum(shard["processed"] for shard in shards), 31)
+        for shard in shards:
+            expected = sum(1 for row in rows if shard_of(row["externalID"], 3) == shard["shard"])
+            self.assertEqual(shard["processed"], expected)
+        self.assertEqual(len(self.server.members), 30)
+        self.assertEqual(metrics.snapshot()["create_member"]["requests"], 30)
+        # One token for the whole run, fetched by the parent and shared through the store.
+        self.assertEqual(self.server.requests["token"], 1)
+        # Logged in a worker process and written by this one.
+        self.assertTrue(any(r.name == "memd_api.bulk" and invalid["externalID"] in r.getMessage()
+                            for r in handler.records))
+
+    def test_dead_worker_stops_the_others(self):
+        def sync_or_die(client, rows, workers=8, dry_run=False):
+            summary = BulkSummary()
+            for row in rows:
+                if row["externalID"] == "die":
+                    os._exit(3)
+                summary.record(row["externalID"], 0.0)
+            return summary
+
+        # Enough rows for the dead shard's queue to fill up while the others still wait for theirs.
+        rows = [{"externalID": "die"}] + [{"externalID": f"member-{i}"} for i in range(3000)]
+        started = time.monotonic()
+        # Forked workers run the patched sync_roster.
+        with mock.patch("memd_api.sharding.sync_roster", sync_or_die):
+            with self.assertRaises(RuntimeError) as caught:
+                sync_roster_sharded(self.server.dict_config(), rows, processes=3, workers=1, token_dir=self.tmp_dir)
+        self.assertIn("exited with code 3", str(caught.exception))
+        self.assertEqual(multiprocessing.active_children(), [])
+        self.assertLess(time.monotonic() - started, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
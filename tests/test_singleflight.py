@@ -0,0 +1,103 @@
+import threading
+import time
+import unittest
+
+from memd_api.singleflight import SingleFlight
+from support import FakeServerTestCase
+
+
+def run_threads(count, target):
+    """ Runs target(i) in count threads started together, returns their results in order. """
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(i):
+        barrier.wait()
+        results[i] = target(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return "result"
+
+        results = run_threads(5, lambda i: flights.do(("member", "a"), slow))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], ["result"] * 5)
+        self.assertEqual(sorted(shared for _, shared in results), [False] + [True] * 4)
+        self.assertEqual(flights.stats(), {"member": {"calls": 5, "collapsed": 4}})
+
+    def test_followers_get_the_exception(self):
+        flights = SingleFlight()
+
+        def fail():
+            time.sleep(0.1)
+            raise KeyError("a")
+
+        def call(i):
+            try:
+                flights.do(("member", "a"), fail)
+            except KeyError as exc:
+                return exc
+
+        self.assertTrue(all(isinstance(exc, KeyError) for exc in run_threads(3, call)))
+
+    def test_forget_starts_a_new_call(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def first():
+            started.set()
+            release.wait()
+            return "old"
+
+        thread = threading.Thread(target=flights.do, args=(("member", "a"), first))
+        thread.start()
+        started.wait()
+        flights.forget(("member", "a"))
+        self.assertEqual(flights.do(("member", "a"), lambda: "new"), ("new", False))
+        release.set()
+        thread.join()
+
+
+class ClientSingleFlightTest(FakeServerTestCase):
+    server_options = {"latency": 0.1}
+
+    def test_concurrent_gets_share_one_request(self):
+        client = self.make_client()
+        external_id = self.create_member()["externalID"]
+        members = run_threads(6, lambda i: client.get_primary_member(external_id))
+        self.assertEqual(self.server.requests["get_member"], 1)
+        self.assertEqual(self.server.requests["token"], 1)
+        self.assertEqual(client.metrics.snapshot()["get_member"]["collapsed"], 5)
+
+        # Every caller, the one whose request it was too, has its own copy to edit.
+        self.assertEqual(len({id(member._data) for member in members}), 6)
+        members[0]._data["policies"].append({"plancode": "EDITED"})
+        for member in members[1:]:
+            self.assertEqual(len(member._data["policies"]), 1)
+
+    def test_disabled(self):
+        client = self.make_client(single_flight=False)
+        client.access_token
+        external_id = self.create_member()["externalID"]
+        run_threads(3, lambda i: client.get_primary_member(external_id))
+        self.assertEqual(self.server.requests["get_member"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import time
+import unittest
+
+from requests.exceptions import HTTPError
+
+from memd_api.throttle import AdaptiveLimiter, CircuitBreaker, CircuitOpenError
+from support import FakeServerTestCase
+
+
+def release(limiter, latency, overloaded=False, endpoint="partnermember", started=None):
+    """ Acquires a slot and releases it as if the request had taken latency seconds. """
+    limiter.acquire()
+    if started is None:
+        started = time.monotonic() - latency
+    limiter.release(started, overloaded=overloaded, endpoint=endpoint)
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+
+    def test_healthy_responses_grow_the_limit(self):
+        limiter = AdaptiveLimiter(initial=4, maximum=8)
+        for _ in range(20):
+            release(limiter, 0.001)
+        self.assertGreater(limiter.limit, 4)
+        for _ in range(500):
+            release(limiter, 0.001)
+        self.assertEqual(limiter.limit, 8)
+
+    def test_overload_halves_once_per_round_trip(self):
+        limiter = AdaptiveLimiter(initial=16)
+        sent = time.monotonic()
+        limiter.acquire()
+        limiter.acquire()
+        limiter.release(sent, overloaded=True)
+        self.assertEqual(limiter.limit, 8)
+        # Sent before the decrease, it doesn't shrink the limit again.
+        limiter.release(sent, overloaded=True)
+        self.assertEqual(limiter.limit, 8)
+        release(limiter, 0.0, overloaded=True)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_limit_stays_within_bounds(self):
+        limiter = AdaptiveLimiter(initial=2, minimum=2)
+        for _ in range(5):
+            release(limiter, 0.0, overloaded=True)
+        self.assertEqual(limiter.limit, 2)
+        with self.assertRaises(ValueError):
+            AdaptiveLimiter(initial=100, maximum=64)
+
+    def test_latency_rise_shrinks_the_limit(self):
+        limiter = AdaptiveLimiter(initial=16)
+        for _ in range(5):
+            release(limiter, 0.01)
+        limit = limiter.limit
+        release(limiter, 0.3)
+        self.assertEqual(limiter.limit, limit // 2)
+
+    def test_baseline_follows_a_lasting_latency_shift(self):
+        limiter = AdaptiveLimiter(initial=16, baseline_decay=0.2)
+        for _ in range(5):
+            release(limiter, 0.01)
+        for _ in range(100):
+            release(limiter, 0.3)
+        self.assertGreater(limiter.snapshot()["baseline_latency_ms"]["partnermember"], 100)
+        limit = limiter.limit
+        for _ in range(20):
+            release(limiter, 0.3)
+        self.assertGreater(limiter.limit, limit)
+
+    def test_baselines_are_per_endpoint(self):
+        limiter = AdaptiveLimiter(initial=16)
+        for _ in range(5):
+            release(limiter, 0.01)
+        limit = limiter.limit
+        release(limiter, 0.5, endpoint="policy")
+        self.assertGreaterEqual(limiter.limit, limit)
+        self.assertEqual(set(limiter.snapshot()["baseline_latency_ms"]), {"partnermember", "policy"})
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("partnermember", failure_threshold=2, reset_timeout=60)
+        breaker.record(True)
+        breaker.record(False)
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = CircuitBreaker("partnermember", failure_threshold=1, reset_timeout=0.05)
+        breaker.record(True)
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record(False)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.before_call()
+
+    def test_failed_trial_opens_again(self):
+        breaker = CircuitBreaker("partnermember", failure_threshold=3, reset_timeout=0.05)
+        for _ in range(3):
+            breaker.record(True)
+        time.sleep(0.06)
+        breaker.before_call()
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class ClientBreakerTest(FakeServerTestCase):
+
+    def test_open_breaker_fails_fast(self):
+        client = self.make_client(max_retries=0, breaker_failure_threshold=2, breaker_reset_timeout=60)
+        client.access_token
+        self.server.error_rate = 1.0
+        for _ in range(2):
+            with self.assertRaises(HTTPError):
+                client.get_primary_member("missing")
+        with self.assertRaises(CircuitOpenError):
+            client.get_primary_member("missing")
+        self.assertEqual(self.server.requests["get_member"], 2)
+        self.assertEqual(client.limits()["breakers"]["partnermember"]["state"], CircuitBreaker.OPEN)
+        self.assertEqual(client.limits()["breakers"]["token"]["state"], CircuitBreaker.CLOSED)
+
+
+if __name__ == "__main__":
+    unittest.main()
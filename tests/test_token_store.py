@@ -0,0 +1,56 @@
+import threading
+
+from requests.exceptions import HTTPError
+
+from memd_api.token_store import FileTokenStore
+from support import FakeServerTestCase
+
+
+class TokenStoreTest(FakeServerTestCase):
+
+    def test_clients_share_one_token(self):
+        store = FileTokenStore(self.tmp_dir)
+        first = self.make_client(token_store=store)
+        second = self.make_client(token_store=store)
+        self.assertEqual(first.access_token, second.access_token)
+        self.assertEqual(self.server.requests["token"], 1)
+
+    def test_concurrent_refresh_fetches_once(self):
+        store = FileTokenStore(self.tmp_dir)
+        clients = [self.make_client(token_store=store) for _ in range(8)]
+        threads = [threading.Thread(target=lambda c=c: c.access_token) for c in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.requests["token"], 1)
+        self.assertEqual(len({c.access_token for c in clients}), 1)
+
+    def test_rejected_token_is_evicted_and_refreshed_once(self):
+        store = FileTokenStore(self.tmp_dir)
+        first = self.make_client(token_store=store)
+        second = self.make_client(token_store=store)
+        external_id = self.create_member()["externalID"]
+        first.get_primary_member(external_id)
+        rejected = first.access_token
+        # Revoke every token, as MEMD does when it rotates its signing keys.
+        self.server.tokens.clear()
+
+        first.get_primary_member(external_id)
+        self.assertNotEqual(first.access_token, rejected)
+        self.assertEqual(store.load(store.key_for(first.base_url, first.username, first.client_id))["access_token"],
+                         first.access_token)
+        # The second client still holds the revoked token, it adopts the stored one instead of fetching.
+        second.get_primary_member(external_id)
+        self.assertEqual(second.access_token, first.access_token)
+        self.assertEqual(self.server.requests["token"], 2)
+
+    def test_persistent_401_is_not_retried_forever(self):
+        client = self.make_client(max_retries=0)
+        client.access_token
+        self.server.token_valid = lambda authorization: False
+        with self.assertRaises(HTTPError) as caught:
+            client.get_primary_member("missing")
+        self.assertEqual(caught.exception.response.status_code, 401)
+        self.assertEqual(self.server.requests["token"], 2)
+        self.assertEqual(self.server.requests["get_member"], 2)
@@ -0,0 +1,45 @@
+import unittest
+
+from jsonschema.exceptions import ValidationError
+
+from memd_api.client import Client
+from support import make_member
+
+
+class ValidationTest(unittest.TestCase):
+
+    def test_validator_is_compiled_once(self):
+        self.assertIs(Client.get_validator(), Client.get_validator())
+
+    def test_valid_member(self):
+        Client.validate_member(make_member())
+        self.assertEqual(Client.member_errors(make_member()), [])
+
+    def test_invalid_member_raises(self):
+        member = make_member()
+        del member["phone"]
+        with self.assertRaises(ValidationError):
+            Client.validate_member(member)
+
+    def test_member_errors_lists_every_error(self):
+        member = make_member(preferredLanguage="EN")
+        del member["phone"]
+        member["address"]["zipCode"] = 85281
+        errors = Client.member_errors(member)
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(errors[0].startswith("<root>: 'phone'"))
+        self.assertTrue(any(e.startswith("address/zipCode:") for e in errors))
+        self.assertTrue(any(e.startswith("preferredLanguage:") for e in errors))
+
+    def test_validate_many_reports_invalid_members_in_order(self):
+        members = [make_member(i) for i in range(25)]
+        for index in (3, 11, 24):
+            del members[index]["email"]
+        for workers in (1, 2):
+            results = list(Client.validate_many(members, workers=workers, chunk_size=4))
+            self.assertEqual([index for index, _ in results], [3, 11, 24])
+            self.assertTrue(all(errors == ["<root>: 'email' is a required property"] for _, errors in results))
+
+
+if __name__ == "__main__":
+    unittest.main()